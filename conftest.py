@@ -0,0 +1,9 @@
+def pytest_configure(config):
+    """То же окружение прогона, что у manage.py test (core.testing)."""
+    from core.testing import TestEnvironment
+    config.test_environment = TestEnvironment()
+    config.test_environment.enable()
+
+
+def pytest_unconfigure(config):
+    config.test_environment.disable()
@@ -0,0 +1,92 @@
+"""Поля ответов API и выбор только нужных колонок (?fields=)."""
+from collections import namedtuple
+
+# columns — колонки для only(), related — связи для select_related,
+# value — значение поля из объекта модели.
+Field = namedtuple('Field', 'columns related value')
+
+
+class ApiError(Exception):
+    status = 400
+
+
+class NotAuthenticated(ApiError):
+    status = 401
+
+
+def username_field(relation):
+    return Field((relation, f'{relation}__username'), (relation,),
+                 lambda obj: getattr(obj, relation).username)
+
+
+def attribute_field(name):
+    return Field((name,), (), lambda obj: getattr(obj, name))
+
+
+POST_FIELDS = {
+    'id': Field(('id',), (), lambda post: post.pk),
+    'text': attribute_field('text'),
+    'pub_date': attribute_field('pub_date'),
+    'author': username_field('author'),
+    'group': Field(('group', 'group__slug'), ('group',),
+                   lambda post: post.group and post.group.slug),
+    'image': Field(('image',), (),
+                   lambda post: post.image.url if post.image else None),
+    'comments_count': attribute_field('comments_count'),
+}
+
+GROUP_FIELDS = {
+    'id': Field(('id',), (), lambda group: group.pk),
+    'title': attribute_field('title'),
+    'slug': attribute_field('slug'),
+    'description': attribute_field('description'),
+}
+
+COMMENT_FIELDS = {
+    'id': Field(('id',), (), lambda comment: comment.pk),
+    'post': Field(('post',), (), lambda comment: comment.post_id),
+    'author': username_field('author'),
+    'text': attribute_field('text'),
+    'pub_date': attribute_field('pub_date'),
+}
+
+FOLLOW_FIELDS = {
+    'id': Field(('id',), (), lambda follow: follow.pk),
+    'user': username_field('user'),
+    'author': username_field('author'),
+}
+
+
+def requested_fields(request, fields):
+    """Имена полей из ?fields=a,b; без параметра — все поля."""
+    raw = request.GET.get('fields')
+    if not raw:
+        return list(fields)
+    names = list(dict.fromkeys(
+        name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in fields]
+    if unknown or not names:
+        raise ApiError(
+            f'Неизвестные поля: {", ".join(unknown)}. '
+            f'Доступны: {", ".join(fields)}.')
+    return names
+
+
+def narrow(queryset, fields, names, keys=(), prefix=''):
+    """Ограничивает queryset колонками и связями полей names. keys —
+    колонки, нужные пагинатору независимо от запроса. prefix — путь
+    до модели полей, например 'post__' для записей ленты подписок."""
+    columns = list(keys)
+    related = [prefix[:-2]] if prefix else []
+    for name in names:
+        columns += (prefix + column for column in fields[name].columns)
+        related += (prefix + relation for relation in fields[name].related)
+    if prefix:
+        columns.append(prefix[:-2])
+    return (queryset.select_related(None)
+            .select_related(*dict.fromkeys(related))
+            .only(*dict.fromkeys(columns)))
+
+
+def serialize(obj, fields, names):
+    return {name: fields[name].value(obj) for name in names}
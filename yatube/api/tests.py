@@ -0,0 +1,111 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+
+POSTS_AMOUNT = settings.POSTS_AMOUNT + 3
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.posts = [Post.objects.create(author=cls.author, group=cls.group,
+                                         text=f'Пост {i}')
+                     for i in range(POSTS_AMOUNT)]
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.comment = Comment.objects.create(
+            post=cls.posts[0], author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def get(self, name, params=None, status=HTTPStatus.OK, **kwargs):
+        response = self.client.get(reverse(f'api:{name}', kwargs=kwargs),
+                                   params or {})
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def test_feeds_are_cursor_paginated(self):
+        self.client.force_login(self.reader)
+        for name, kwargs in (('posts', {}),
+                             ('group_posts', {'slug': self.group.slug}),
+                             ('author_posts', {'username': 'author'}),
+                             ('follow_feed', {})):
+            with self.subTest(name=name):
+                first = self.get(name, **kwargs)
+                self.assertEqual(first['count'], POSTS_AMOUNT)
+                self.assertIsNone(first['previous'])
+                self.assertEqual(len(first['results']),
+                                 settings.POSTS_AMOUNT)
+                second = self.client.get(first['next']).json()
+                self.assertEqual(
+                    [post['id'] for post in
+                     first['results'] + second['results']],
+                    [post.pk for post in reversed(self.posts)])
+
+    def test_fields_limit_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.get('posts', {'fields': 'id,author'})
+        self.assertEqual(data['results'][0],
+                         {'id': self.posts[-1].pk, 'author': 'author'})
+        page_query = next(query['sql'] for query in queries
+                          if 'LIMIT' in query['sql'])
+        self.assertNotIn('"text"', page_query)
+        self.assertNotIn('posts_group', page_query)
+
+    def test_unknown_field_is_rejected(self):
+        data = self.get('posts', {'fields': 'id,password'},
+                        status=HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', data['detail'])
+
+    def test_follow_feed_requires_login(self):
+        self.get('follow_feed', status=HTTPStatus.UNAUTHORIZED)
+
+    def test_batch_keeps_order_and_reports_missing(self):
+        ids = [self.posts[2].pk, 0, self.posts[1].pk]
+        data = self.get('posts_batch', {
+            'ids': ','.join(map(str, ids)), 'fields': 'id,text'})
+        self.assertEqual(data['results'], [
+            {'id': self.posts[2].pk, 'text': 'Пост 2'},
+            {'id': self.posts[1].pk, 'text': 'Пост 1'}])
+        self.assertEqual(data['missing'], [0])
+        self.get('posts_batch', {'ids': 'a,b'},
+                 status=HTTPStatus.BAD_REQUEST)
+
+    def test_details_and_lists(self):
+        post = self.get('post_detail', post_id=self.posts[0].pk)
+        self.assertEqual(post['group'], self.group.slug)
+        self.assertEqual(post['comments_count'], 1)
+        comments = self.get('post_comments', post_id=self.posts[0].pk)
+        self.assertEqual(comments['results'][0]['author'], 'reader')
+        self.assertEqual(self.get('group_detail', slug='group')['title'],
+                         'Группа')
+        self.assertEqual(self.get('groups')['results'][0]['slug'], 'group')
+        following = self.get('user_following', username='reader')
+        self.assertEqual(following['results'][0]['author'], 'author')
+        followers = self.get('user_followers', username='author',
+                             params={'fields': 'user'})
+        self.assertEqual(followers['results'], [{'user': 'reader'}])
+        self.get('post_detail', post_id=0, status=HTTPStatus.NOT_FOUND)
+
+    def test_follows_without_stats_row(self):
+        """Без строки счётчиков списки подписок считаются запросом,
+        а не падают."""
+        UserStats.objects.filter(user__in=(self.author, self.reader)).delete()
+        following = self.get('user_following', username='reader')
+        self.assertEqual(following['count'], 1)
+        self.assertEqual(following['results'][0]['author'], 'author')
+        followers = self.get('user_followers', username='author')
+        self.assertEqual(followers['results'][0]['user'], 'reader')
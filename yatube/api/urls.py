@@ -0,0 +1,24 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/batch/', views.posts_batch, name='posts_batch'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments, name='post_comments'),
+    path('groups/', views.groups, name='groups'),
+    path('groups/<slug:slug>/', views.group_detail, name='group_detail'),
+    path('groups/<slug:slug>/posts/',
+         views.group_posts, name='group_posts'),
+    path('users/<str:username>/posts/',
+         views.author_posts, name='author_posts'),
+    path('users/<str:username>/following/',
+         views.user_following, name='user_following'),
+    path('users/<str:username>/followers/',
+         views.user_followers, name='user_followers'),
+    path('follow/', views.follow_feed, name='follow_feed'),
+]
@@ -0,0 +1,174 @@
+from functools import wraps
+
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from posts.feeds import author_feed, follower_feed, global_feed, group_feed
+from posts.models import Group, Post, User
+from posts.utils import IdPaginator, pagination
+from .fields import (COMMENT_FIELDS, FOLLOW_FIELDS, GROUP_FIELDS,
+                     POST_FIELDS, ApiError, NotAuthenticated, narrow,
+                     requested_fields, serialize)
+
+BATCH_MAX_IDS = 100
+POST_KEYS = ('id', 'pub_date')
+
+
+def api_view(view):
+    """Оборачивает словарь из view в JSON, ошибки отдаёт как
+    {"detail": ...} с нужным статусом."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return JsonResponse(view(request, *args, **kwargs))
+        except Http404:
+            return JsonResponse({'detail': 'Не найдено.'}, status=404)
+        except ApiError as error:
+            return JsonResponse({'detail': str(error)}, status=error.status)
+    return wrapper
+
+
+def page_link(request, cursor):
+    if not cursor:
+        return None
+    params = request.GET.copy()
+    params.pop('page', None)
+    params['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def page_response(request, page, fields, names, objects=None):
+    return {
+        'count': page.paginator.count,
+        'next': page_link(request, page.next_cursor),
+        'previous': page_link(request, page.previous_cursor),
+        'results': [serialize(obj, fields, names)
+                    for obj in (page if objects is None else objects)],
+    }
+
+
+def feed_response(request, feed):
+    """Страница ленты из posts.feeds: тот же запрос, что у HTML-страницы,
+    но только с колонками запрошенных полей."""
+    names = requested_fields(request, POST_FIELDS)
+    if feed.ordering is None:
+        items = narrow(feed.items, POST_FIELDS, names, keys=POST_KEYS)
+        page = pagination(request, items, count=feed.count)
+        return page_response(request, page, POST_FIELDS, names)
+    items = narrow(feed.items, POST_FIELDS, names,
+                   keys=('pub_date', 'post'), prefix='post__')
+    page = pagination(request, items, feed.ordering, feed.count)
+    return page_response(request, page, POST_FIELDS, names,
+                         [entry.post for entry in page])
+
+
+@api_view
+def posts(request):
+    return feed_response(request, global_feed())
+
+
+@api_view
+def posts_batch(request):
+    """Посты по списку ?ids=1,2,3 в порядке запроса; ненайденные id
+    перечислены в missing."""
+    try:
+        ids = list(dict.fromkeys(
+            int(pk) for pk in request.GET.get('ids', '').split(',') if pk))
+    except ValueError:
+        raise ApiError('ids — список целых чисел через запятую.')
+    if not 0 < len(ids) <= BATCH_MAX_IDS:
+        raise ApiError(f'Нужно от 1 до {BATCH_MAX_IDS} id.')
+    names = requested_fields(request, POST_FIELDS)
+    found = narrow(Post.objects.all(), POST_FIELDS, names,
+                   keys=POST_KEYS).in_bulk(ids)
+    return {
+        'results': [serialize(found[pk], POST_FIELDS, names)
+                    for pk in ids if pk in found],
+        'missing': [pk for pk in ids if pk not in found],
+    }
+
+
+@api_view
+def post_detail(request, post_id):
+    names = requested_fields(request, POST_FIELDS)
+    post = get_object_or_404(
+        narrow(Post.objects.all(), POST_FIELDS, names, keys=POST_KEYS),
+        pk=post_id)
+    return serialize(post, POST_FIELDS, names)
+
+
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('comments_count'), pk=post_id)
+    names = requested_fields(request, COMMENT_FIELDS)
+    comments = narrow(post.comments.all(), COMMENT_FIELDS, names,
+                      keys=('id', 'pub_date'))
+    page = pagination(request, comments, count=post.comments_count)
+    return page_response(request, page, COMMENT_FIELDS, names)
+
+
+@api_view
+def groups(request):
+    names = requested_fields(request, GROUP_FIELDS)
+    page = pagination(request,
+                      narrow(Group.objects.all(), GROUP_FIELDS, names,
+                             keys=('id',)),
+                      paginator_class=IdPaginator)
+    return page_response(request, page, GROUP_FIELDS, names)
+
+
+@api_view
+def group_detail(request, slug):
+    names = requested_fields(request, GROUP_FIELDS)
+    group = get_object_or_404(
+        narrow(Group.objects.all(), GROUP_FIELDS, names, keys=('id',)),
+        slug=slug)
+    return serialize(group, GROUP_FIELDS, names)
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed_response(request, group_feed(group))
+
+
+@api_view
+def author_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_response(request, author_feed(author))
+
+
+def follows_response(request, username, side, count_field):
+    """Подписки пользователя (side='user') или на него (side='author')."""
+    user = get_object_or_404(User.objects.select_related('stats'),
+                             username=username)
+    names = requested_fields(request, FOLLOW_FIELDS)
+    follows = narrow(
+        user.follower.all() if side == 'user' else user.following.all(),
+        FOLLOW_FIELDS, names, keys=('id',))
+    # Строки счётчиков может не быть (пользователь из загрузки мимо
+    # сигналов): тогда пагинатор посчитает подписки сам.
+    stats = getattr(user, 'stats', None)
+    page = pagination(request, follows,
+                      count=getattr(stats, count_field, None),
+                      paginator_class=IdPaginator)
+    return page_response(request, page, FOLLOW_FIELDS, names)
+
+
+@api_view
+def user_following(request, username):
+    return follows_response(request, username, 'user', 'following_count')
+
+
+@api_view
+def user_followers(request, username):
+    return follows_response(request, username, 'author', 'followers_count')
+
+
+@api_view
+def follow_feed(request):
+    if not request.user.is_authenticated:
+        raise NotAuthenticated('Нужно войти на сайт.')
+    return feed_response(request, follower_feed(request.user))
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db.models import Max, Q
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .jobs import ready_jobs
+from .models import Job
+
+# Больше любого символа в пределах Юникода: term <= x < term + PREFIX_END
+# для строк, начинающихся с term.
+PREFIX_END = '\U0010ffff'
+# selected_object не передан: выбранный объект читается из базы.
+_NOT_PRELOADED = object()
+
+
+def prefix_filter(term, *fields):
+    """Строки, начинающиеся с term хотя бы в одном из полей. Условие
+    записано диапазонами, а не LIKE 'term%', поэтому SQLite идёт по
+    индексу поля. Диапазон сравнивает с учётом регистра, поэтому term
+    ищется как введён, строчными, прописными и с заглавной буквы:
+    «иван» найдёт «Иван», но не «иВАН»."""
+    condition = Q()
+    for variant in {term, term.lower(), term.upper(), term.capitalize()}:
+        for field in fields:
+            condition |= Q(**{f'{field}__gte': variant,
+                              f'{field}__lt': variant + PREFIX_END})
+    return condition
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор changelist без COUNT(*) по всей таблице: для
+    неотфильтрованного списка число строк оценивается по MAX(id), это
+    один шаг по индексу первичного ключа. Удалённые строки оценку
+    завышают, последние страницы при этом просто окажутся пустыми."""
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.where:
+            return super().count
+        return self.object_list.aggregate(estimate=Max('pk'))['estimate'] or 0
+
+
+class RowAutocompleteSelect(AutocompleteSelect):
+    """Автодополнение, которое может взять выбранный объект из уже
+    загруженной строки (selected_object) вместо запроса к базе: иначе
+    в list_editable каждая строка changelist стоит отдельный запрос."""
+    selected_object = _NOT_PRELOADED
+
+    def optgroups(self, name, value, attr=None):
+        selected = self.selected_object
+        expected = set() if selected is None else {str(selected.pk)}
+        if (selected is _NOT_PRELOADED or expected != {
+                str(v) for v in value
+                if str(v) not in self.choices.field.empty_values}):
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        if selected is not None:
+            options.append(self.create_option(
+                name, selected.pk,
+                self.choices.field.label_from_instance(selected),
+                True, len(options)))
+        return [(None, options, 0)]
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Основа админки для больших таблиц: оценка вместо точного
+    количества, поиск по префиксу индексированных полей prefix_fields
+    и автодополнение в list_editable без запроса на строку (связанные
+    объекты должны быть в list_select_related)."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    prefix_fields = ()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name in self.get_autocomplete_fields(request):
+            kwargs.setdefault('widget', RowAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using')))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        form = super().get_changelist_form(request, **kwargs)
+        preloaded = [name for name in self.list_editable
+                     if name in self.get_autocomplete_fields(request)]
+
+        class ChangeListForm(form):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                for name in preloaded:
+                    widget = self.fields[name].widget
+                    widget = getattr(widget, 'widget', widget)
+                    widget.selected_object = getattr(self.instance, name)
+
+        return ChangeListForm
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not self.prefix_fields or not search_term:
+            return super().get_search_results(
+                request, queryset, search_term)
+        return queryset.filter(
+            prefix_filter(search_term, *self.prefix_fields)), False
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо списка всех значений: список
+    вариантов пришлось бы строить по всей таблице."""
+    template = 'admin/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'value': self.value() or '',
+            'parameter_name': self.parameter_name,
+            'other_params': {
+                key: value for key, value in changelist.params.items()
+                if key != self.parameter_name},
+            'reset_url': changelist.get_query_string(
+                remove=[self.parameter_name]),
+        }
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Очередь фоновых задач. В заголовке списка — сколько задач ждёт
+    и сколько провалено; если задачи давно не разбирают, админка
+    предупреждает, что runworker, похоже, не запущен."""
+    list_display = ('name', 'args', 'priority', 'run_at', 'attempts',
+                    'locked_by', 'failed_at')
+    ordering = ('failed_at', '-priority', 'run_at')
+    readonly_fields = ('name', 'args', 'priority', 'dedup_key', 'run_at',
+                       'attempts', 'max_attempts', 'locked_by',
+                       'locked_until', 'failed_at', 'last_error', 'created')
+
+    def has_add_permission(self, request):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        now = timezone.now()
+        waiting = ready_jobs(now)
+        oldest = waiting.order_by('run_at').values_list(
+            'run_at', flat=True).first()
+        if oldest and ((now - oldest).total_seconds()
+                       > settings.JOB_QUEUE_WARNING_DELAY):
+            self.message_user(
+                request,
+                f'Задачи ждут с {timezone.localtime(oldest):%d.%m %H:%M}: '
+                f'похоже, manage.py runworker не запущен.',
+                messages.WARNING)
+        failed = Job.objects.filter(failed_at__isnull=False).count()
+        return super().changelist_view(request, {
+            **(extra_context or {}),
+            'title': f'Фоновые задачи: ждут {waiting.count()}, '
+                     f'провалено {failed}',
+        })
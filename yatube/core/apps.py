@@ -1,5 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def clear_caches(**kwargs):
+    """Общий кэш живёт дольше процесса: после миграций (в том числе
+    при создании тестовой базы) в нём могут остаться данные старой схемы."""
+    from django.conf import settings
+    from django.core.cache import caches
+    for alias in settings.CACHES:
+        caches[alias].clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_caches, sender=self)
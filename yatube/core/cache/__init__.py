@@ -0,0 +1,3 @@
+from .sqlite import SQLiteCache
+
+__all__ = ['SQLiteCache']
@@ -0,0 +1,230 @@
+"""Кэш в файле SQLite, общий для всех процессов и потоков на хосте.
+
+В отличие от LocMemCache все WSGI-воркеры видят одни и те же записи,
+поэтому сброс ключа в одном процессе сразу виден остальным. Внешний
+демон не нужен: файл открывается в режиме WAL, каждая запись атомарна,
+при переполнении вытесняются давно не читавшиеся ключи (LRU).
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from core.timing import record_cache_read
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, '
+    'expires REAL, accessed REAL NOT NULL) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+ALIVE = '(expires IS NULL OR expires > ?)'
+
+
+class SQLiteCache(BaseCache):
+    """Бэкенд кэша Django поверх одного файла SQLite.
+
+    OPTIONS:
+        MAX_ENTRIES, CULL_FREQUENCY -- как у встроенных бэкендов;
+        CULL_EVERY -- проверять переполнение раз в столько записей;
+        ACCESS_RESOLUTION -- время чтения для LRU обновляется не чаще,
+            чем раз в столько секунд, чтобы чтения не становились записями;
+        BUSY_TIMEOUT -- сколько секунд ждать блокировку другого процесса.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.location = location
+        self.cull_every = int(options.get('CULL_EVERY', 100))
+        self.access_resolution = float(options.get('ACCESS_RESOLUTION', 1))
+        self.busy_timeout = float(options.get('BUSY_TIMEOUT', 5))
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def connection(self):
+        """Соединение открывается одно на поток и живёт между запросами;
+        после fork открывается заново. Общее на потоки соединение нельзя:
+        BEGIN IMMEDIATE из двух потоков сталкивается в одной транзакции."""
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(
+                self.location, timeout=self.busy_timeout,
+                isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                connection.execute(statement)
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @contextmanager
+    def _atomic(self):
+        """BEGIN IMMEDIATE: блокировка записи берётся сразу, поэтому
+        чтение-изменение-запись не пересекается с другими процессами."""
+        connection = self.connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+
+    def _store(self, key, value, timeout, now):
+        return (key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                self.get_backend_timeout(timeout), now)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self.connection.execute(
+            'INSERT INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+            'value = excluded.value, expires = excluded.expires, '
+            'accessed = excluded.accessed '
+            'WHERE cache.expires IS NOT NULL AND cache.expires <= ?',
+            (*self._store(key, value, timeout, now), now))
+        self._written(now)
+        return cursor.rowcount > 0
+
+    def get(self, key, default=None, version=None):
+        started = time.perf_counter()
+        key = self._key(key, version)
+        now = time.time()
+        row = self.connection.execute(
+            f'SELECT value, accessed FROM cache WHERE key = ? AND {ALIVE}',
+            (key, now)).fetchone()
+        if row is None:
+            record_cache_read(0, 1, started)
+            return default
+        if now - row[1] > self.access_resolution:
+            self.connection.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?', (now, key))
+        value = pickle.loads(row[0])
+        record_cache_read(1, 0, started)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        if timeout == 0:
+            # Как у встроенных бэкендов: с таймаутом 0 значение
+            # не сохраняется.
+            self.connection.execute('DELETE FROM cache WHERE key = ?',
+                                    (key,))
+            return
+        now = time.time()
+        self.connection.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+            'VALUES (?, ?, ?, ?)', self._store(key, value, timeout, now))
+        self._written(now)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        cursor = self.connection.execute(
+            f'UPDATE cache SET expires = ?, accessed = ? '
+            f'WHERE key = ? AND {ALIVE}',
+            (self.get_backend_timeout(timeout), now, key, now))
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        self.connection.execute('DELETE FROM cache WHERE key = ?',
+                                (self._key(key, version),))
+
+    def has_key(self, key, version=None):
+        return self.connection.execute(
+            f'SELECT 1 FROM cache WHERE key = ? AND {ALIVE}',
+            (self._key(key, version), time.time())).fetchone() is not None
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        with self._atomic() as connection:
+            row = connection.execute(
+                f'SELECT value FROM cache WHERE key = ? AND {ALIVE}',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            # incr — тоже обращение: счётчик не должен вытесняться как
+            # давно не читавшийся.
+            connection.execute(
+                'UPDATE cache SET value = ?, accessed = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), time.time(),
+                 key))
+        return value
+
+    def get_many(self, keys, version=None):
+        started = time.perf_counter()
+        keys = {self._key(key, version): key for key in keys}
+        if not keys:
+            return {}
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.connection.execute(
+            f'SELECT key, value FROM cache '
+            f'WHERE key IN ({placeholders}) AND {ALIVE}',
+            (*keys, time.time()))
+        found = {keys[key]: pickle.loads(value) for key, value in rows}
+        record_cache_read(len(found), len(keys) - len(found), started)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        rows = [self._store(self._key(key, version), value, timeout, now)
+                for key, value in data.items()]
+        with self._atomic() as connection:
+            connection.executemany(
+                'INSERT OR REPLACE INTO cache (key, value, expires, accessed) '
+                'VALUES (?, ?, ?, ?)', rows)
+        self._written(now, len(rows))
+        return []
+
+    def delete_many(self, keys, version=None):
+        rows = [(self._key(key, version),) for key in keys]
+        with self._atomic() as connection:
+            connection.executemany('DELETE FROM cache WHERE key = ?', rows)
+
+    def clear(self):
+        self.connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        """Соединение постоянное: Django вызывает close() после каждого
+        запроса, но переоткрывать файл каждый раз незачем."""
+
+    def _written(self, now, amount=1):
+        self._writes += amount
+        if self._writes >= self.cull_every:
+            self._writes = 0
+            self._cull(now)
+
+    def _cull(self, now):
+        """Удаляет просроченные ключи, а при переполнении -- давно
+        не читавшиеся, как встроенные бэкенды: долю 1/CULL_FREQUENCY."""
+        with self._atomic() as connection:
+            connection.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+            count = connection.execute(
+                'SELECT COUNT(*) FROM cache').fetchone()[0]
+            if count <= self._max_entries:
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache')
+                return
+            excess = (count - self._max_entries
+                      + self._max_entries // self._cull_frequency)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', (excess,))
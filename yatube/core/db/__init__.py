@@ -0,0 +1,2 @@
+"""Бэкенд базы данных SQLite с настройкой каждого соединения PRAGMA
+из OPTIONS['pragmas'] (ENGINE = 'core.db')."""
@@ -0,0 +1,20 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """Встроенный бэкенд sqlite3, который выполняет PRAGMA из
+    OPTIONS['pragmas'] ({имя: значение}) при открытии соединения.
+    Базу в памяти (тестовую) не трогает: WAL и mmap ей не нужны."""
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pragmas', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        if not self.is_in_memory_db():
+            pragmas = self.settings_dict['OPTIONS'].get('pragmas', {})
+            for name, value in pragmas.items():
+                connection.execute(f'PRAGMA {name} = {value}')
+        return connection
@@ -0,0 +1,145 @@
+"""Фоновая очередь задач в базе проекта.
+
+Задача — функция с декоратором @job. func.enqueue(*args) записывает
+вызов в таблицу core_job в той же транзакции, что и остальные
+изменения запроса: откат отменяет и задачу, а обработчик увидит её
+только после коммита. Выполняет задачи команда runworker.
+
+Задачи с большим priority берутся раньше. Упавшая задача повторяется
+через JOB_RETRY_DELAY * 2 ** (попытка - 1) секунд, а после max_attempts
+попыток остаётся в таблице с failed_at. Пока задача с dedup_key ждёт
+или выполняется, такая же постановка ничего не делает. Задачи должны
+быть идемпотентны: если обработчик умрёт посреди задачи, через
+JOB_LOCK_TIMEOUT её возьмёт другой.
+
+С JOBS_EAGER задачи выполняются сразу при постановке, без обработчика
+(так в тестах). Иначе runworker должен быть запущен всегда: очередь
+без него только растёт, её размер виден в админке.
+"""
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+DEFAULT_MAX_ATTEMPTS = 5
+
+logger = logging.getLogger(__name__)
+
+
+def job(priority=0, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """Делает функцию задачей очереди и добавляет ей func.enqueue(*args,
+    **options) — вызов enqueue для этой функции. Аргументы задачи
+    хранятся в JSON, поэтому передавать стоит id, а не объекты."""
+    def decorator(func):
+        func.job_options = {'priority': priority,
+                            'max_attempts': max_attempts}
+        func.enqueue = partial(enqueue, func)
+        return func
+    return decorator
+
+
+def enqueue(func, *args, dedup_key=None, delay=None, priority=None):
+    """Ставит в очередь вызов func(*args) через delay (timedelta);
+    priority заменяет приоритет задачи из @job."""
+    args = json.dumps(args, ensure_ascii=False)
+    if settings.JOBS_EAGER:
+        func(*json.loads(args))
+        return
+    options = dict(func.job_options)
+    if priority is not None:
+        options['priority'] = priority
+    Job.objects.bulk_create([Job(
+        name=f'{func.__module__}.{func.__qualname__}', args=args,
+        dedup_key=dedup_key,
+        run_at=timezone.now() + (delay or timedelta()),
+        **options)], ignore_conflicts=True)
+
+
+def ready_jobs(now):
+    return (Job.objects
+            .filter(Q(locked_until__isnull=True) | Q(locked_until__lt=now),
+                    run_at__lte=now, failed_at__isnull=True)
+            .order_by('-priority', 'run_at', 'pk'))
+
+
+def claim_job(worker):
+    """Забирает следующую готовую задачу или возвращает None. UPDATE
+    проверяет прежнее значение locked_until, поэтому из нескольких
+    обработчиков задачу получит только один."""
+    while True:
+        now = timezone.now()
+        job = ready_jobs(now).first()
+        if job is None:
+            return None
+        claimed = Job.objects.filter(
+            pk=job.pk, locked_until=job.locked_until
+        ).update(locked_by=worker,
+                 locked_until=now + timedelta(
+                     seconds=settings.JOB_LOCK_TIMEOUT),
+                 attempts=F('attempts') + 1)
+        if claimed:
+            job.attempts += 1
+            return job
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.JOB_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def run_job(job):
+    """Выполняет забранную задачу: удачную удаляет, упавшую
+    откладывает или, если попытки кончились, помечает проваленной.
+    Возвращает True при успехе."""
+    try:
+        func = import_string(job.name)
+        if not hasattr(func, 'job_options'):
+            raise ImportError(f'{job.name} не задача очереди')
+        func(*json.loads(job.args))
+    except Exception:
+        logger.exception('Задача %s упала, попытка %s из %s',
+                         job, job.attempts, job.max_attempts)
+        now = timezone.now()
+        changes = {'locked_by': '', 'locked_until': None,
+                   'last_error': traceback.format_exc()}
+        if job.attempts >= job.max_attempts:
+            changes['failed_at'] = now
+        else:
+            changes['run_at'] = now + retry_delay(job.attempts)
+        Job.objects.filter(pk=job.pk).update(**changes)
+        return False
+    Job.objects.filter(pk=job.pk).delete()
+    return True
+
+
+def work(once=False, sleep=1.0, stop=None):
+    """Цикл обработчика. Пустую очередь опрашивает раз в sleep секунд,
+    а с once сразу выходит; stop (threading.Event) останавливает цикл
+    между задачами. Возвращает (выполнено, упало)."""
+    worker = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+    done = failed = 0
+    try:
+        while stop is None or not stop.is_set():
+            job = claim_job(worker)
+            if job is None:
+                if once:
+                    break
+                time.sleep(sleep)
+            elif run_job(job):
+                done += 1
+            else:
+                failed += 1
+    except KeyboardInterrupt:
+        pass
+    return done, failed
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'sqlite': 'core.cache.SQLiteCache',
+}
+
+
+def run_worker(backend, location, worker, workers, operations, barrier,
+               results):
+    """Воркер пишет свои ключи, ждёт остальных и читает ключи соседа:
+    доля попаданий показывает, видят ли процессы общий кэш."""
+    cache = import_string(backend)(location, {
+        'OPTIONS': {'MAX_ENTRIES': operations * workers * 2}})
+    value = 'x' * 512
+    barrier.wait()
+    started = time.perf_counter()
+    for i in range(operations):
+        cache.set(f'{worker}:{i}', value)
+    set_time = time.perf_counter() - started
+    barrier.wait()
+    neighbour = (worker + 1) % workers
+    started = time.perf_counter()
+    hits = sum(cache.get(f'{neighbour}:{i}') is not None
+               for i in range(operations))
+    get_time = time.perf_counter() - started
+    results.put((set_time, get_time, hits))
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность get/set бэкендов кэша '
+            'при одновременной работе нескольких процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--operations', type=int, default=5000)
+        parser.add_argument('--backend', choices=BACKENDS,
+                            action='append', dest='backends')
+
+    def handle(self, *args, workers, operations, backends, **options):
+        context = multiprocessing.get_context('fork')
+        self.stdout.write(f'{"бэкенд":<8} {"set/с":>10} {"get/с":>10} '
+                          f'{"попаданий":>10}')
+        for name in backends or BACKENDS:
+            with tempfile.TemporaryDirectory() as directory:
+                location = os.path.join(directory, 'cache.sqlite3')
+                barrier = context.Barrier(workers)
+                results = context.Queue()
+                processes = [
+                    context.Process(target=run_worker, args=(
+                        BACKENDS[name], location, worker, workers,
+                        operations, barrier, results))
+                    for worker in range(workers)]
+                for process in processes:
+                    process.start()
+                stats = [results.get() for _ in processes]
+                for process in processes:
+                    process.join()
+            total = operations * workers
+            set_time = max(stat[0] for stat in stats)
+            get_time = max(stat[1] for stat in stats)
+            hits = sum(stat[2] for stat in stats) / total
+            self.stdout.write(f'{name:<8} {total / set_time:>10.0f} '
+                              f'{total / get_time:>10.0f} {hits:>10.0%}')
@@ -0,0 +1,135 @@
+import os
+import random
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+
+from posts.models import Comment, Group, Post, User
+
+USERS = 100
+POSTS = 2000
+PAGE_SIZE = 10
+
+
+def profiles():
+    """Настройки базы: как было (журнал отката, соединение на запрос)
+    и как в settings.DATABASES."""
+    tuned = settings.DATABASES['default']
+    return {
+        'default': {'ENGINE': 'django.db.backends.sqlite3',
+                    'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+        'tuned': {'ENGINE': tuned['ENGINE'],
+                  'CONN_MAX_AGE': tuned.get('CONN_MAX_AGE', 0),
+                  'OPTIONS': tuned.get('OPTIONS', {})},
+    }
+
+
+def prepare(alias):
+    with connections[alias].schema_editor() as editor:
+        for model in (User, Group, Post, Comment):
+            editor.create_model(model)
+    User.objects.using(alias).bulk_create(
+        User(id=pk, username=f'user{pk}') for pk in range(1, USERS + 1))
+    Post.objects.using(alias).bulk_create(
+        (Post(id=pk, author_id=random.randint(1, USERS), text='Пост ' * 50)
+         for pk in range(1, POSTS + 1)), batch_size=500)
+    connections[alias].close()
+
+
+def read(alias, rng):
+    """Страница ленты и число комментариев поста, как в post_detail."""
+    list(Post.objects.using(alias).select_related('author', 'group')
+         .order_by('-pub_date')[:PAGE_SIZE])
+    Comment.objects.using(alias).filter(
+        post_id=rng.randint(1, POSTS)).count()
+
+
+def write(alias, rng):
+    """Комментарий со сдвигом счётчика, как в add_comment."""
+    post_id = rng.randint(1, POSTS)
+    with transaction.atomic(using=alias):
+        Comment.objects.using(alias).bulk_create([Comment(
+            post_id=post_id, author_id=rng.randint(1, USERS),
+            text='Комментарий')])
+        Post.objects.using(alias).filter(pk=post_id).update(
+            comments_count=F('comments_count') + 1)
+
+
+def run_worker(alias, seconds, write_share, seed, barrier, results):
+    rng = random.Random(seed)
+    stats = {'reads': 0, 'writes': 0, 'errors': 0, 'latencies': []}
+    connection = connections[alias]
+    barrier.wait()
+    deadline = time.perf_counter() + seconds
+    try:
+        while time.perf_counter() < deadline:
+            is_write = rng.random() < write_share
+            started = time.perf_counter()
+            try:
+                (write if is_write else read)(alias, rng)
+            except OperationalError:
+                stats['errors'] += 1
+            else:
+                stats['writes' if is_write else 'reads'] += 1
+            # Конец запроса: при CONN_MAX_AGE = 0 соединение закрывается.
+            connection.close_if_unusable_or_obsolete()
+            stats['latencies'].append(time.perf_counter() - started)
+    finally:
+        connection.close()
+    results.append(stats)
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность SQLite при одновременных '
+            'чтениях и записях из нескольких потоков: исходные настройки '
+            '(журнал отката, соединение на каждый запрос) против '
+            'настроек из settings.DATABASES. База временная, рабочая не '
+            'затрагивается.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5)
+        parser.add_argument('--writes', type=float, default=0.2,
+                            metavar='ДОЛЯ', help='Доля записей, от 0 до 1.')
+        parser.add_argument('--profile', choices=profiles(),
+                            action='append', dest='profiles')
+
+    def handle(self, *args, threads, seconds, writes, **options):
+        self.stdout.write(f'{"профиль":<8} {"чтений/с":>10} '
+                          f'{"записей/с":>10} {"ошибок":>7} {"p95, мс":>8}')
+        for name in options['profiles'] or profiles():
+            # Свой псевдоним на профиль: соединения потоков кэшируются
+            # по псевдониму.
+            alias = f'benchmark_{name}'
+            with tempfile.TemporaryDirectory() as directory:
+                connections.databases[alias] = {
+                    **profiles()[name],
+                    'NAME': os.path.join(directory, 'benchmark.sqlite3')}
+                try:
+                    prepare(alias)
+                    barrier = threading.Barrier(threads)
+                    results = []
+                    workers = [
+                        threading.Thread(target=run_worker, args=(
+                            alias, seconds, writes, seed, barrier, results))
+                        for seed in range(threads)]
+                    for worker in workers:
+                        worker.start()
+                    for worker in workers:
+                        worker.join()
+                finally:
+                    del connections.databases[alias]
+            latencies = sorted(latency for stats in results
+                               for latency in stats['latencies'])
+            p95 = latencies[int(len(latencies) * 0.95)] if latencies else 0
+            self.stdout.write(
+                f'{name:<8} '
+                f'{sum(s["reads"] for s in results) / seconds:>10.0f} '
+                f'{sum(s["writes"] for s in results) / seconds:>10.0f} '
+                f'{sum(s["errors"] for s in results):>7} '
+                f'{p95 * 1000:>8.1f}')
@@ -0,0 +1,66 @@
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.jobs import work
+
+POLL_INTERVAL = 1.0
+
+
+def pooled_work(once, sleep, stop=None):
+    try:
+        return work(once=once, sleep=sleep, stop=stop)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = ('Выполняет фоновые задачи из очереди core.jobs: миниатюры, '
+            'рассылку постов по лентам подписчиков, письма.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=0,
+            help='Число потоков (с --processes — процессов); '
+                 '0 — один обработчик в текущем потоке.')
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Пул процессов вместо потоков: для задач, упирающихся '
+                 'в процессор, как нарезка миниатюр.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выйти, когда очередь опустеет.')
+        parser.add_argument('--sleep', type=float, default=POLL_INTERVAL,
+                            help='Пауза опроса пустой очереди, с.')
+
+    def handle(self, *args, **options):
+        workers, once, sleep = (
+            options['workers'], options['once'], options['sleep'])
+        if not workers:
+            results = [work(once=once, sleep=sleep)]
+        else:
+            stop = threading.Event()
+            if options['processes']:
+                # Дочерние процессы не должны делить соединение с родителем.
+                connections.close_all()
+                pool = ProcessPoolExecutor(workers)
+                futures = [pool.submit(pooled_work, once, sleep)
+                           for _ in range(workers)]
+            else:
+                pool = ThreadPoolExecutor(workers, thread_name_prefix='jobs')
+                futures = [pool.submit(pooled_work, once, sleep, stop)
+                           for _ in range(workers)]
+            with pool:
+                try:
+                    wait(futures)
+                except KeyboardInterrupt:
+                    # Процессы получают Ctrl+C сами, потокам нужен stop.
+                    self.stderr.write('Остановка после текущих задач…')
+                    stop.set()
+                    wait(futures)
+            results = [future.result() for future in futures]
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено задач: {sum(done for done, _ in results)}, '
+            f'с ошибкой: {sum(failed for _, failed in results)}.'))
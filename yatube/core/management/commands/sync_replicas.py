@@ -0,0 +1,24 @@
+import sqlite3
+from contextlib import closing
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.routers import replicas
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик '
+            '(DATABASE_REPLICAS) онлайн-бэкапом, не останавливая сайт. '
+            'Для проверки чтения с реплик без настоящей репликации.')
+
+    def handle(self, *args, **options):
+        source = connections[DEFAULT_DB_ALIAS]
+        source.ensure_connection()
+        for alias in replicas():
+            replica = connections[alias]
+            replica.close()
+            with closing(sqlite3.connect(
+                    replica.settings_dict['NAME'])) as target:
+                source.connection.backup(target)
+            self.stdout.write(f'{alias}: {replica.settings_dict["NAME"]}')
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Q
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -10,3 +12,33 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class Job(models.Model):
+    """Задача фоновой очереди (см. core.jobs). Выполненные задачи
+    удаляются, исчерпавшие попытки остаются с failed_at."""
+    name = models.CharField('Задача', max_length=200)
+    args = models.TextField('Аргументы (JSON)', default='[]')
+    priority = models.SmallIntegerField('Приоритет', default=0)
+    dedup_key = models.CharField('Ключ уникальности', max_length=200,
+                                 null=True, blank=True)
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField('Попыток не больше')
+    locked_by = models.CharField('Обработчик', max_length=100, blank=True)
+    locked_until = models.DateTimeField('Занята до', null=True, blank=True)
+    failed_at = models.DateTimeField('Провалена', null=True, blank=True)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [models.Index(fields=('-priority', 'run_at'),
+                                name='core_job_ready_idx')]
+        constraints = [models.UniqueConstraint(
+            fields=('dedup_key',), condition=Q(failed_at__isnull=True),
+            name='unique_pending_job')]
+
+    def __str__(self):
+        return f'{self.name}{self.args}'
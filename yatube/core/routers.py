@@ -0,0 +1,84 @@
+"""Чтение с реплик, запись в основную базу.
+
+Реплики — все базы из DATABASES, кроме default (см. DATABASE_REPLICAS
+в settings). На случайную реплику уходят только чтения моделей из
+REPLICA_APPS в GET-запросах к представлениям из REPLICA_VIEWS: такие
+запросы отмечает ReplicaMiddleware. Всё остальное читается из
+основной базы, все записи идут в неё.
+
+После любой записи пользователь получает куку и REPLICA_STICKY_SECONDS
+секунд читает только из основной базы, поэтому сразу видит свой пост,
+комментарий или подписку, даже если реплика отстаёт.
+
+Поколение ленты сдвигается в основной базе сразу, а реплика может ещё
+не знать о записи. Поэтому то, что прочитано с реплики, в общий кэш не
+пишется (см. reading_from_replica): иначе устаревшая страница осталась
+бы под новым поколением до следующего сброса.
+"""
+import random
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = 'read_primary'
+
+_local = threading.local()
+
+
+def replicas():
+    return [alias for alias in connections if alias != DEFAULT_DB_ALIAS]
+
+
+def reading_from_replica():
+    """Читает ли текущий запрос с реплики."""
+    return getattr(_local, 'replica', None) is not None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_local, 'replica', None)
+        if replica and model._meta.app_label in settings.REPLICA_APPS:
+            return replica
+        return None
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """Реплики — копии основной базы, связи между ними допустимы."""
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        """Схема реплик приходит из основной базы вместе с данными."""
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaMiddleware:
+    """Направляет чтения представлений из REPLICA_VIEWS на реплику,
+    если у пользователя нет куки недавней записи, и ставит эту куку,
+    если запрос что-то записал."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        _local.wrote = False
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.replica = None
+        if _local.wrote:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        aliases = replicas()
+        if (aliases and request.method in ('GET', 'HEAD')
+                and STICKY_COOKIE not in request.COOKIES
+                and request.resolver_match.view_name
+                in settings.REPLICA_VIEWS):
+            _local.replica = random.choice(aliases)
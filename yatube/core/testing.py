@@ -0,0 +1,54 @@
+"""Окружение на весь прогон тестов: для manage.py test его включает
+TestRunner (settings.TEST_RUNNER), для pytest — conftest.py в корне
+репозитория."""
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+# В тестах медленным бывает почти любой запрос, этот журнал не нужен.
+QUIET_LOGGERS = ('yatube.slow_requests',)
+
+
+class TestEnvironment:
+    def enable(self):
+        # Загрузки и миниатюры из тестов не должны оставаться в media.
+        self.media_root = tempfile.mkdtemp()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.media_root,
+            # Обработчика очереди в тестах нет.
+            JOBS_EAGER=True,
+            # Свой файл кэша: тесты его чистят (core.apps.clear_caches,
+            # cache.clear()), а кэш разработки должен уцелеть.
+            CACHES={**settings.CACHES, 'default': {
+                **settings.CACHES['default'],
+                'LOCATION': os.path.join(settings.BASE_DIR, 'cache',
+                                         'test.sqlite3')}},
+        )
+        self.settings.enable()
+        self.handlers = {}
+        for name in QUIET_LOGGERS:
+            logger = logging.getLogger(name)
+            self.handlers[name] = logger.handlers
+            logger.handlers = [logging.NullHandler()]
+
+    def disable(self):
+        for name, handlers in self.handlers.items():
+            logging.getLogger(name).handlers = handlers
+        self.settings.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.environment = TestEnvironment()
+        self.environment.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.environment.disable()
+        super().teardown_test_environment(**kwargs)
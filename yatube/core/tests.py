@@ -0,0 +1,308 @@
+import json
+import re
+import shutil
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from core.cache import SQLiteCache
+from core.db.base import DatabaseWrapper
+from core.jobs import job
+from core.models import Job
+from core.routers import STICKY_COOKIE
+from posts.models import Post, User
+
+CALLS = []
+
+
+@job(max_attempts=2)
+def record_call(value):
+    CALLS.append(value)
+
+
+@job(max_attempts=2)
+def broken_job():
+    raise RuntimeError('Сломалась')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.location = f'{self.directory}/cache.sqlite3'
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.location, {'OPTIONS': options})
+
+    def test_basic_operations(self):
+        """get/set/add/incr/delete работают как у встроенных бэкендов."""
+        self.cache.set('key', {'value': 1})
+        self.assertEqual(self.cache.get('key'), {'value': 1})
+        self.assertFalse(self.cache.add('key', 'other'))
+        self.assertTrue(self.cache.add('new', 10))
+        self.assertEqual(self.cache.incr('new', 5), 15)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 2})
+        self.cache.delete_many(['a', 'key'])
+        self.cache.set('b', 3, 0)
+        self.assertIsNone(self.cache.get('b'))
+        self.assertFalse(self.cache.has_key('a'))
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_keys_are_invisible(self):
+        """Просроченный ключ не читается, и add может его занять."""
+        self.cache.set('key', 'old', timeout=0)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+        self.assertEqual(self.cache.get('key'), 'new')
+
+    def test_writes_are_shared_between_instances(self):
+        """Второй экземпляр (как другой процесс) видит записи
+        и сбросы первого."""
+        other = self.make_cache()
+        self.cache.set('version', 1)
+        self.assertEqual(other.incr('version'), 2)
+        self.assertEqual(self.cache.get('version'), 2)
+        other.delete('version')
+        self.assertIsNone(self.cache.get('version'))
+
+    def test_threads_share_one_instance(self):
+        """Потоки одного процесса пишут через один экземпляр бэкенда
+        без ошибок и потерянных инкрементов."""
+        threads_amount, rounds = 8, 50
+        self.cache.set('counter', 0)
+        errors = []
+
+        def work(number):
+            try:
+                for round_number in range(rounds):
+                    self.cache.set_many({f'{number}:{round_number}': 1})
+                    self.cache.incr('counter')
+            except Exception as error:
+                errors.append(error)
+
+        threads = [threading.Thread(target=work, args=(number,))
+                   for number in range(threads_amount)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.cache.get('counter'), threads_amount * rounds)
+
+    def test_cull_evicts_least_recently_used(self):
+        """При переполнении вытесняются давно не читавшиеся ключи."""
+        cache = self.make_cache(MAX_ENTRIES=4, CULL_EVERY=1,
+                                CULL_FREQUENCY=4, ACCESS_RESOLUTION=0)
+        for key in 'abcd':
+            cache.set(key, key)
+            time.sleep(0.01)
+        cache.get('a')
+        cache.set('e', 'e')
+        self.assertEqual(sorted(cache.get_many('abcde')), ['a', 'd', 'e'])
+
+
+class SQLitePragmasTests(SimpleTestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            wrapper = DatabaseWrapper({
+                **connection.settings_dict,
+                'NAME': f'{directory}/db.sqlite3'}, alias='pragmas')
+            try:
+                with wrapper.cursor() as cursor:
+                    values = {}
+                    for name in ('journal_mode', 'synchronous',
+                                 'busy_timeout', 'cache_size'):
+                        cursor.execute(f'PRAGMA {name}')
+                        values[name] = cursor.fetchone()[0]
+            finally:
+                wrapper.close()
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1,
+                                  'busy_timeout': 5000,
+                                  'cache_size': -64 * 1024})
+
+
+class ServerTimingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.create(author=author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def timings(self, response):
+        return {name: (float(duration), description)
+                for name, duration, description in re.findall(
+                    r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?',
+                    response['Server-Timing'])}
+
+    def test_header_reports_sql_cache_and_templates(self):
+        timings = self.timings(self.client.get(reverse('posts:index')))
+        self.assertEqual(set(timings), {'sql', 'cache', 'tpl', 'total'})
+        self.assertRegex(timings['sql'][1], r'^[1-9]\d* queries$')
+        self.assertGreater(timings['tpl'][0], 0)
+        cached = self.timings(self.client.get(reverse('posts:index')))
+        self.assertRegex(cached['cache'][1], r'^[1-9]\d* hits')
+        self.assertEqual(cached['tpl'][0], 0)
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs('yatube.slow_requests', 'WARNING') as logs:
+            self.client.get(reverse('posts:index'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'posts:index')
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['queries_count'], len(record['queries']))
+        self.assertIn('posts_post', ' '.join(
+            query['sql'] for query in record['queries']))
+
+
+@override_settings(JOBS_EAGER=False)
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def run_worker(self):
+        call_command('runworker', '--once', stdout=StringIO())
+
+    def test_jobs_run_by_priority_when_due(self):
+        record_call.enqueue('обычная')
+        record_call.enqueue('срочная', priority=5)
+        record_call.enqueue('отложенная', delay=timedelta(hours=1))
+        self.assertEqual(CALLS, [])
+        self.run_worker()
+        self.assertEqual(CALLS, ['срочная', 'обычная'])
+        self.assertEqual(list(Job.objects.values_list('args', flat=True)),
+                         ['["отложенная"]'])
+
+    def test_dedup_key_keeps_one_pending_job(self):
+        for _ in range(3):
+            record_call.enqueue('раз', dedup_key='record:1')
+        record_call.enqueue('другая', dedup_key='record:2')
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_failed_job_is_retried_with_backoff(self):
+        """Упавшая задача откладывается, после max_attempts попыток
+        остаётся проваленной и освобождает ключ уникальности."""
+        broken_job.enqueue(dedup_key='broken')
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.run_worker()
+        failed = Job.objects.get()
+        self.assertEqual(failed.attempts, 1)
+        self.assertIsNone(failed.failed_at)
+        self.assertGreater(failed.run_at,
+                           timezone.now() + timedelta(seconds=5))
+        self.assertIn('Сломалась', failed.last_error)
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            self.run_worker()
+        failed.refresh_from_db()
+        self.assertEqual(failed.attempts, 2)
+        self.assertIsNotNone(failed.failed_at)
+        self.run_worker()
+        broken_job.enqueue(dedup_key='broken')
+        self.assertEqual(Job.objects.count(), 2)
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_mode_runs_immediately(self):
+        record_call.enqueue('сразу')
+        self.assertEqual(CALLS, ['сразу'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_admin_shows_queue_size_and_stalled_worker(self):
+        """Список задач в админке показывает размер очереди и
+        предупреждает, если готовые задачи давно никто не берёт."""
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        url = reverse('admin:core_job_changelist')
+        record_call.enqueue('свежая')
+        response = self.client.get(url)
+        self.assertContains(response, 'Фоновые задачи: ждут 1, провалено 0')
+        self.assertNotContains(response, 'runworker')
+
+        Job.objects.update(run_at=timezone.now() - timedelta(
+            seconds=settings.JOB_QUEUE_WARNING_DELAY + 1))
+        self.assertContains(self.client.get(url), 'runworker не запущен')
+
+    def test_password_reset_email_is_queued(self):
+        User.objects.create_user(username='forgetful', email='me@ya.ru',
+                                 password='secret')
+        self.client.post(reverse('users:password_reset'),
+                         {'email': 'me@ya.ru'})
+        self.assertEqual(mail.outbox, [])
+        self.run_worker()
+        self.assertEqual(mail.outbox[0].to, ['me@ya.ru'])
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """Реплика — копия тестовой базы, снятая sync_replicas."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+        connections.databases['replica'] = {
+            **connection.settings_dict,
+            'NAME': f'{cls.directory}/replica.sqlite3'}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections['replica'].close()
+        del connections.databases['replica']
+        shutil.rmtree(cls.directory, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        Post.objects.create(author=self.author, text='До копии')
+        call_command('sync_replicas', stdout=StringIO())
+        self.profile = reverse('posts:profile', args=('author',))
+
+    def test_listed_views_read_from_replica(self):
+        Post.objects.create(author=self.author, text='После копии')
+        page_obj = self.client.get(self.profile).context['page_obj']
+        self.assertEqual([post.text for post in page_obj], ['До копии'])
+        self.assertEqual(page_obj[0]._state.db, 'replica')
+        self.assertEqual(self.client.get(reverse('posts:search'), {
+            'q': 'копии'}).context['page_obj'].paginator.count, 2)
+
+    def test_writer_reads_own_post_from_primary(self):
+        self.client.force_login(self.author)
+        response = self.client.post(reverse('posts:post_create'),
+                                    {'text': 'Свежий пост'}, follow=True)
+        self.assertIn(STICKY_COOKIE, self.client.cookies)
+        self.assertEqual(
+            [post.text for post in response.context['page_obj']],
+            ['Свежий пост', 'До копии'])
+        other = self.client_class().get(self.profile)
+        self.assertEqual([post.text for post in other.context['page_obj']],
+                         ['До копии'])
+        self.assertFalse(other.has_header('ETag'))
+
+        # Отставшая страница не попала в кэш под новым поколением.
+        call_command('sync_replicas', stdout=StringIO())
+        self.assertContains(self.client_class().get(self.profile),
+                            'Свежий пост')
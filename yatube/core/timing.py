@@ -0,0 +1,143 @@
+"""Замеры запроса: SQL, чтения кэша и рендеринг шаблонов.
+
+ServerTimingMiddleware собирает их для каждого запроса, отдаёт
+заголовком Server-Timing (виден во вкладке Network браузера) и пишет
+медленные запросы вместе с их SQL в журнал yatube.slow_requests
+одной JSON-строкой. Чтения кэша сообщает бэкенд core.cache.SQLiteCache,
+рендеринг шаблонов -- бэкенд TimedDjangoTemplates.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('yatube.slow_requests')
+
+# Сколько запросов SQL попадает в журнал для одного медленного запроса.
+SLOW_LOG_MAX_QUERIES = 100
+
+_local = threading.local()
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.queries = []
+        self.sql_time = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_time = 0
+        self.template_time = 0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        """Обёртка для connection.execute_wrapper."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.sql_time += duration
+            self.queries.append((sql, duration))
+
+    def server_timing(self, total):
+        """Значение заголовка Server-Timing, длительности в мс. Время
+        шаблонов включает запросы, выполненные при рендеринге."""
+        return ', '.join((
+            f'sql;dur={self.sql_time * 1000:.1f};'
+            f'desc="{len(self.queries)} queries"',
+            f'cache;dur={self.cache_time * 1000:.1f};'
+            f'desc="{self.cache_hits} hits, {self.cache_misses} misses"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    def slow_log_record(self, request, response, total):
+        match = request.resolver_match
+        return {
+            'method': request.method,
+            'path': request.get_full_path(),
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'sql_ms': round(self.sql_time * 1000, 1),
+            'template_ms': round(self.template_time * 1000, 1),
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'queries_count': len(self.queries),
+            # Без параметров: в них бывают пароли и ключи сессий.
+            'queries': [{'sql': sql, 'ms': round(duration * 1000, 2)}
+                        for sql, duration
+                        in self.queries[:SLOW_LOG_MAX_QUERIES]],
+        }
+
+
+def current_metrics():
+    """Замеры текущего запроса этого потока или None вне запроса."""
+    return getattr(_local, 'metrics', None)
+
+
+def record_cache_read(hits, misses, started):
+    """Учитывает чтение кэша, начатое в started (time.perf_counter)."""
+    metrics = current_metrics()
+    if metrics is not None:
+        metrics.cache_hits += hits
+        metrics.cache_misses += misses
+        metrics.cache_time += time.perf_counter() - started
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = current_metrics()
+        if metrics is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, время рендеринга которых попадает в замеры.
+    Учитывается только шаблон страницы целиком: включённые в него
+    шаблоны рендерит сам движок, мимо бэкенда."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template,
+                             self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template,
+                             self)
+
+
+class ServerTimingMiddleware:
+    """Добавляет к ответу Server-Timing и пишет в журнал запросы дольше
+    SLOW_REQUEST_MS миллисекунд. Стоит первой в MIDDLEWARE, чтобы
+    замеры покрывали остальные middleware."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _local.metrics = RequestMetrics()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(metrics.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _local.metrics = None
+        total = time.perf_counter() - started
+        response['Server-Timing'] = metrics.server_timing(total)
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(json.dumps(
+                metrics.slow_log_record(request, response, total),
+                ensure_ascii=False))
+        return response
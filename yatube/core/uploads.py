@@ -0,0 +1,92 @@
+"""Загрузка картинок: ограничение размера и нормализация оригинала.
+
+MaxSizeUploadHandler стоит первым в FILE_UPLOAD_HANDLERS и перестаёт
+передавать дальше байты файла, как только их больше UPLOAD_MAX_SIZE:
+остаток тела запроса читается и выбрасывается, в память и на диск
+попадает не больше предела. Вместо файла форма получает RejectedUpload
+и показывает ошибку (см. posts.forms.PostForm).
+
+normalize_image поворачивает картинку по EXIF, уменьшает её до
+UPLOAD_MAX_SIDE по большей стороне и сохраняет без метаданных, поэтому
+миниатюры режутся из небольшого файла.
+"""
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
+
+# Форматы, которые всегда пересохраняются. Остальные (GIF, анимация
+# и т.п.) хранятся как загружены.
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 85, 'optimize': True},
+    'PNG': {'optimize': True},
+    'WEBP': {'quality': 85},
+}
+
+
+class RejectedUpload(UploadedFile):
+    """Файл, который обработчик загрузки отказался принимать."""
+
+    def __init__(self, name, content_type, size, error):
+        super().__init__(BytesIO(), name, content_type, size)
+        self.error = error
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        # Размер файла в заголовке части присылают не все клиенты.
+        self.rejected = (self.content_length or 0) > settings.UPLOAD_MAX_SIZE
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_SIZE:
+            self.rejected = True
+        return None if self.rejected else raw_data
+
+    def file_complete(self, file_size):
+        if not self.rejected:
+            return None
+        return RejectedUpload(
+            self.file_name, self.content_type, self.received,
+            f'Файл больше {filesizeformat(settings.UPLOAD_MAX_SIZE)}.')
+
+
+def normalize_image(upload):
+    """Загруженная картинка, готовая к хранению. upload уже проверен
+    forms.ImageField. Размеры читаются из заголовка, до декодирования:
+    слишком большая картинка отклоняется ValidationError."""
+    upload.seek(0)
+    image = Image.open(upload)
+    width, height = image.size
+    if width * height > settings.UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            f'Картинка {width}×{height} слишком велика: больше '
+            f'{settings.UPLOAD_MAX_PIXELS:,} пикселей.'.replace(',', ' '))
+    image_format = image.format
+    max_side = settings.UPLOAD_MAX_SIDE
+    # Метаданные прячутся в разных местах (EXIF, XMP, IPTC в сегментах
+    # APP JPEG, чанки PNG и WebP), поэтому пересохраняется всё, а не
+    # только то, где они нашлись.
+    if (image_format not in SAVE_OPTIONS
+            or getattr(image, 'is_animated', False)):
+        upload.seek(0)
+        return upload
+    # JPEG декодируется сразу в уменьшенном масштабе, если это возможно.
+    image.draft(None, (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    if image_format == 'JPEG' and image.mode not in ('RGB', 'L', 'CMYK'):
+        image = image.convert('RGB')
+    content = BytesIO()
+    # EXIF и XMP не передаются, цветовой профиль остаётся.
+    image.save(content, image_format,
+               icc_profile=image.info.get('icc_profile'),
+               **SAVE_OPTIONS[image_format])
+    return SimpleUploadedFile(upload.name, content.getvalue(),
+                              upload.content_type)
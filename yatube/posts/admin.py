@@ -1,27 +1,100 @@
 from django.contrib import admin
 
-from .models import Post, Group, Comment, Follow
+from core.admin import InputFilter, LargeTableAdmin
+from .models import Post, PostSearchIndex, Group, Comment, Follow
+from .search import match_query
 
 
-class PostAdmin(admin.ModelAdmin):
+class UsernameFilter(InputFilter):
+    """Фильтр по точному имени пользователя в поле user_field."""
+    user_field = 'author'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(
+                **{f'{self.user_field}__username': self.value().strip()})
+        return queryset
+
+
+class AuthorFilter(UsernameFilter):
+    title = 'автору'
+    parameter_name = 'author'
+
+
+class FollowerFilter(UsernameFilter):
+    title = 'подписчику'
+    parameter_name = 'user'
+    user_field = 'user'
+
+
+class GroupFilter(InputFilter):
+    title = 'сообществу (slug)'
+    parameter_name = 'group'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(group__slug=self.value().strip())
+        return queryset
+
+
+class PostIdFilter(InputFilter):
+    title = 'посту (id)'
+    parameter_name = 'post'
+
+    def queryset(self, request, queryset):
+        if self.value():
+            try:
+                return queryset.filter(post_id=int(self.value()))
+            except ValueError:
+                return queryset.none()
+        return queryset
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
-    list_filter = ('pub_date',)
+    list_filter = ('pub_date', AuthorFilter, GroupFilter)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу, а не LIKE по всем постам.
+        Число в запросе дополнительно ищется как id поста."""
+        match = match_query(search_term)
+        if match is None:
+            return queryset, False
+        found = PostSearchIndex.objects.search(match).values('post_id')
+        if search_term.strip().isdigit():
+            return queryset.filter(
+                pk__in=found) | queryset.filter(pk=int(search_term)), False
+        return queryset.filter(pk__in=found), False
+
+
+class GroupAdmin(LargeTableAdmin):
+    list_display = ('title', 'slug')
+    search_fields = ('title', 'slug')
+    prefix_fields = ('title', 'slug')
+
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('post', 'author', 'text',)
-    list_filter = ('post',)
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    list_filter = (PostIdFilter, AuthorFilter)
+    ordering = ('-pk',)
 
 
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = ('user', 'author',)
-    list_filter = ('author',)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    list_filter = (AuthorFilter, FollowerFilter)
+    ordering = ('-pk',)
 
 
 admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
+admin.site.register(Group, GroupAdmin)
 admin.site.register(Follow, FollowAdmin)
 admin.site.register(Comment, CommentAdmin)
@@ -0,0 +1,144 @@
+"""Массовая запись данных мимо save() и сигналов."""
+from contextlib import contextmanager
+
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from .counters import reconcile_comment_counts, reconcile_user_stats
+from .models import (Comment, Follow, Post, PostSearchIndex, TimelineEntry,
+                     User, UserStats)
+from .search import rebuild_search_index
+from .signals import rebuild_timelines
+
+
+@contextmanager
+def keep_dates(*models):
+    """Отключает auto_now/auto_now_add у полей models: bulk_create
+    вызывает pre_save и иначе заменил бы даты из выгрузки текущими."""
+    fields = [field for model in models
+              for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False)
+              or getattr(field, 'auto_now_add', False)]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def bulk_insert(model, objects, ignore_conflicts=False):
+    """Пишет objects одной транзакцией. Размер отдельного INSERT
+    bulk_create подбирает сам: явный batch_size в Django 2.2 не
+    ограничивается лимитами SQLite."""
+    with transaction.atomic():
+        model.objects.bulk_create(objects,
+                                  ignore_conflicts=ignore_conflicts)
+
+
+def insert_rows(model, fields, rows, ignore_conflicts=False):
+    """Пишет rows — кортежи значений полей fields — одним executemany,
+    без объектов моделей и сборки INSERT в ORM; транзакцию задаёт
+    вызывающий. Остальные поля получают значения по умолчанию, даты
+    приводятся к виду для базы."""
+    fields = [model._meta.get_field(name) for name in fields]
+    defaults = [(field.column, field.get_db_prep_save(field.get_default(),
+                                                      connection))
+                for field in model._meta.concrete_fields
+                if field not in fields and not field.primary_key]
+    dates = [index for index, field in enumerate(fields)
+             if field.get_internal_type() == 'DateTimeField']
+    adapt = connection.ops.adapt_datetimefield_value
+    tail = tuple(value for _, value in defaults)
+
+    def prepared():
+        for row in rows:
+            if dates:
+                row = list(row)
+                for index in dates:
+                    row[index] = adapt(row[index])
+                row = tuple(row)
+            yield row + tail
+
+    quote = connection.ops.quote_name
+    columns = [field.column for field in fields] + [
+        column for column, _ in defaults]
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT {"OR IGNORE " if ignore_conflicts else ""}INTO '
+            f'{quote(model._meta.db_table)} '
+            f'({", ".join(map(quote, columns))}) '
+            f'VALUES ({", ".join(["%s"] * len(columns))})',
+            prepared())
+
+
+@contextmanager
+def deferred_indexes(*models):
+    """Снимает неуникальные индексы таблиц models и строит их заново на
+    выходе: одна сортировка по готовой таблице дешевле, чем вставка
+    каждой строки в каждое B-дерево. Уникальные индексы остаются —
+    на них держатся INSERT OR IGNORE."""
+    tables = [model._meta.db_table for model in models]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT name, sql FROM sqlite_master WHERE type = %s '
+            'AND sql IS NOT NULL AND sql NOT LIKE %s AND tbl_name IN '
+            f'({", ".join(["%s"] * len(tables))})',
+            ['index', 'CREATE UNIQUE %', *tables])
+        indexes = cursor.fetchall()
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {connection.ops.quote_name(name)}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for _, sql in indexes:
+                cursor.execute(sql)
+
+
+@contextmanager
+def unsynchronized():
+    """PRAGMA synchronous = OFF на время загрузки: SQLite не ждёт
+    fsync. Сбой ОС посреди загрузки может испортить файл базы, поэтому
+    только для данных, которые можно создать заново. Внутри транзакции
+    (в тестах) SQLite уровень не меняет, и он остаётся прежним."""
+    if connection.in_atomic_block:
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA synchronous')
+        synchronous, = cursor.fetchone()
+        cursor.execute('PRAGMA synchronous = OFF')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA synchronous = {int(synchronous)}')
+
+
+def reset_sequences(*models):
+    """Сдвигает автоинкремент за явно записанные id (как loaddata)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def rebuild_derived_data():
+    """Одним проходом пересчитывает всё, что обычно поддерживают
+    сигналы: счётчики, поисковый индекс и ленты подписок. Кэш лент
+    сбрасывается целиком."""
+    reconcile_user_stats(User, UserStats, Post, Follow)
+    reconcile_comment_counts(Post, Comment)
+    rebuild_search_index(Post, PostSearchIndex)
+    # Строки лент берутся из самих постов и подписок, а проверка внешних
+    # ключей на каждой ищет пост по id вразброс по всей таблице: на
+    # 39 млн строк это больше получаса вместо полутора минут.
+    with deferred_indexes(TimelineEntry), \
+            connection.constraint_checks_disabled():
+        rebuild_timelines()
+    cache.clear()
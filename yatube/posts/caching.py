@@ -0,0 +1,183 @@
+import gzip
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+
+from core.routers import reading_from_replica
+
+FEED_COUNT_KEY = 'feed_count:{}'
+FEED_VERSION_KEY = 'feed_version:{}'
+FEED_RESPONSE_KEY = 'feed_response:{}:{}'
+FOLLOWED_AUTHORS_KEY = 'followed_authors:{}'
+FEED_GLOBAL = 'global'
+FEED_GROUP = 'group'
+FEED_AUTHOR = 'author'
+FEED_FOLLOWER = 'follower'
+
+
+def feed_name(kind, pk=None):
+    return kind if pk is None else f'{kind}:{pk}'
+
+
+def get_or_compute(key, compute, timeout):
+    """cache.get_or_set, который не кэширует прочитанное с реплики:
+    она может отставать от уже сброшенного ключа."""
+    if not reading_from_replica():
+        return cache.get_or_set(key, compute, timeout)
+    value = cache.get(key)
+    return compute() if value is None else value
+
+
+def feed_count(feed, queryset):
+    """Число постов ленты из кэша; COUNT(*) выполняется только после
+    сброса ключа."""
+    return get_or_compute(FEED_COUNT_KEY.format(feed), queryset.count,
+                          settings.FEED_COUNT_TIMEOUT)
+
+
+def invalidate_feed_counts(*feeds):
+    cache.delete_many([FEED_COUNT_KEY.format(feed) for feed in feeds])
+
+
+def followed_authors(user):
+    """Множество id авторов, на которых подписан user, из кэша:
+    состояние подписки для целой страницы авторов проверяется без
+    запросов. У анонимного пользователя подписок нет."""
+    if not user.is_authenticated:
+        return frozenset()
+    return get_or_compute(
+        FOLLOWED_AUTHORS_KEY.format(user.pk),
+        lambda: frozenset(user.follower.values_list('author_id', flat=True)),
+        settings.FOLLOWED_AUTHORS_TIMEOUT)
+
+
+def invalidate_followed_authors(user_id):
+    cache.delete(FOLLOWED_AUTHORS_KEY.format(user_id))
+
+
+def feed_versions(*feeds):
+    """Поколения лент. Поколение -- время последнего изменения ленты
+    в наносекундах; для потерянного ключа берётся текущее время, поэтому
+    оно не совпадает ни с одним старым фрагментом."""
+    keys = [FEED_VERSION_KEY.format(feed) for feed in feeds]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def feed_version(*feeds):
+    """Поколения лент одной строкой для ключа фрагмента кэша."""
+    return '.'.join(map(str, feed_versions(*feeds)))
+
+
+def bump_feed_versions(*feeds):
+    """Переводит ленты в новое поколение: старые фрагменты
+    больше не читаются и вытесняются по таймауту."""
+    now = time.time_ns()
+    cache.set_many(
+        {FEED_VERSION_KEY.format(feed): now for feed in feeds}, None)
+
+
+def feed_cache_context(*feeds):
+    """Контекст для {% cache feed_cache_timeout ... feed_version %}.
+    Фрагменты, отрисованные по реплике, не сохраняются (таймаут 0)."""
+    return {
+        'feed_version': feed_version(*feeds),
+        'feed_cache_timeout': (0 if reading_from_replica()
+                               else settings.FEED_CACHE_TIMEOUT),
+    }
+
+
+def accepts_gzip(request):
+    """Принимает ли клиент gzip: кодировка gzip, а без неё * в
+    Accept-Encoding с ненулевым q. gzip;q=0 означает отказ."""
+    qualities = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    return qualities.get('gzip', qualities.get('*', 0)) > 0
+
+
+def cache_anonymous_feed(get_feed):
+    """Кэширует ответ ленты целиком для анонимных GET-запросов.
+
+    get_feed получает аргументы view и возвращает имя ленты. ETag
+    и Last-Modified берутся из поколения ленты, поэтому повторный запрос
+    с If-None-Match или If-Modified-Since получает 304 без рендеринга.
+    Тело хранится и в сжатом gzip виде.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or request.user.is_authenticated):
+                return view(request, **kwargs)
+            versions = feed_versions(get_feed(**kwargs))
+            version = '.'.join(map(str, versions))
+            path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+            etag = f'W/"{version}-{path}"'
+            last_modified = max(versions) // 10 ** 9
+            response = get_conditional_response(
+                request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = cached_response(request, view, kwargs,
+                                           FEED_RESPONSE_KEY.format(
+                                               version, path))
+            if response is None:
+                # Страница с реплики может не совпадать с поколением:
+                # ни кэша, ни ETag.
+                return view(request, **kwargs)
+            if response.status_code in (200, 304):
+                response['ETag'] = etag
+                response['Last-Modified'] = http_date(last_modified)
+                patch_cache_control(response, no_cache=True)
+                patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+            return response
+        return wrapper
+    return decorator
+
+
+def cached_response(request, view, kwargs, key):
+    """Ответ из кэша или отрисованный и сохранённый в кэш. None, если
+    в кэше его нет, а запрос читает с реплики."""
+    stored = cache.get(key)
+    response = None
+    if stored is None:
+        if reading_from_replica():
+            return None
+        response = view(request, **kwargs)
+        if (response.status_code != 200 or response.streaming
+                or response.cookies):
+            return response
+        stored = {
+            'content_type': response['Content-Type'],
+            'content': response.content,
+            'gzip': gzip.compress(response.content),
+        }
+        cache.set(key, stored, settings.FEED_RESPONSE_CACHE_TIMEOUT)
+    if accepts_gzip(request):
+        response = HttpResponse(stored['gzip'],
+                                content_type=stored['content_type'])
+        response['Content-Encoding'] = 'gzip'
+    elif response is None:
+        response = HttpResponse(stored['content'],
+                                content_type=stored['content_type'])
+    return response
@@ -0,0 +1,55 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field, outer='pk'):
+    """Подзапрос: сколько строк model ссылаются на внешнюю строку
+    через field. Для пустой выборки даёт 0."""
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by().values(field)
+        .annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def change_counters(queryset, **deltas):
+    """Атомарно сдвигает счётчики на deltas одним UPDATE через F().
+    Уменьшение не опускает счётчик ниже нуля."""
+    for field, delta in deltas.items():
+        if delta < 0:
+            queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(
+        **{field: F(field) + delta for field, delta in deltas.items()})
+
+
+def reconcile_user_stats(user_model, stats_model, post_model, follow_model):
+    """Создаёт недостающие счётчики пользователей и пересчитывает
+    разошедшиеся. Возвращает число исправленных строк."""
+    stats_model.objects.bulk_create(
+        (stats_model(user_id=user_id) for user_id in
+         user_model.objects.filter(stats__isnull=True)
+         .values_list('pk', flat=True).iterator()),
+        batch_size=500,
+        ignore_conflicts=True)
+    real_counts = {
+        'posts_count': count_of(post_model, 'author', 'user'),
+        'followers_count': count_of(follow_model, 'author', 'user'),
+        'following_count': count_of(follow_model, 'user', 'user'),
+    }
+    drifted = (stats_model.objects
+               .annotate(**{f'real_{field}': value
+                            for field, value in real_counts.items()})
+               .exclude(**{field: F(f'real_{field}')
+                           for field in real_counts}))
+    return stats_model.objects.filter(
+        pk__in=drifted.values('pk')).update(**real_counts)
+
+
+def reconcile_comment_counts(post_model, comment_model):
+    """Пересчитывает разошедшиеся счётчики комментариев постов.
+    Возвращает число исправленных строк."""
+    real_count = count_of(comment_model, 'post')
+    drifted = (post_model.objects.annotate(real_count=real_count)
+               .exclude(comments_count=F('real_count')))
+    return post_model.objects.filter(
+        pk__in=drifted.values('pk')).update(comments_count=real_count)
@@ -0,0 +1,85 @@
+"""Запросы лент постов, общие для HTML-страниц и JSON API."""
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db.models import OuterRef, Q, Subquery
+from django.utils.functional import SimpleLazyObject
+
+from .caching import (FEED_AUTHOR, FEED_FOLLOWER, FEED_GLOBAL, FEED_GROUP,
+                      feed_count, feed_name)
+from .models import Comment, Post
+
+# items — queryset ленты, count — размер ленты из кэша, ordering — ключ
+# CursorPaginator (None — ключ по умолчанию). Лента подписок состоит из
+# записей TimelineEntry, пост лежит в entry.post.
+Feed = namedtuple('Feed', 'name items count ordering')
+
+TIMELINE_ORDERING = ('-pub_date', '-post_id')
+
+
+def global_feed():
+    return Feed(FEED_GLOBAL,
+                Post.objects.select_related('author', 'group'),
+                feed_count(FEED_GLOBAL, Post.objects),
+                None)
+
+
+def group_feed(group):
+    name = feed_name(FEED_GROUP, group.pk)
+    return Feed(name,
+                group.posts.select_related('author', 'group'),
+                feed_count(name, group.posts),
+                None)
+
+
+def author_feed(author):
+    name = feed_name(FEED_AUTHOR, author.pk)
+    return Feed(name,
+                author.posts.select_related('author', 'group'),
+                feed_count(name, author.posts),
+                None)
+
+
+def follower_feed(user):
+    name = feed_name(FEED_FOLLOWER, user.pk)
+    return Feed(name,
+                user.timeline.select_related('post__author', 'post__group'),
+                feed_count(name, user.timeline),
+                TIMELINE_ORDERING)
+
+
+def latest_comments(post_ids, amount):
+    """Последние amount комментариев каждого поста вместе с авторами
+    одним запросом: {post_id: [комментарии от старых к новым]}.
+
+    Id нужных комментариев выбирают подзапросы «i-й с конца» по индексу
+    (post, pub_date), по одному на позицию, поэтому запрос читает не
+    больше amount строк на пост, сколько бы комментариев у него ни было.
+    """
+    newest = (Comment.objects.filter(post=OuterRef('pk'))
+              .order_by('-pub_date', '-id').values('pk'))
+    posts = Post.objects.filter(pk__in=post_ids)
+    condition = Q()
+    for position in range(amount):
+        condition |= Q(pk__in=posts.annotate(
+            comment=Subquery(newest[position:position + 1])
+        ).values('comment'))
+    comments = defaultdict(list)
+    # Строк не больше amount на пост, сортировать их дешевле здесь.
+    for comment in sorted(
+            Comment.objects.filter(condition).select_related('author')
+            .order_by(), key=lambda comment: (comment.pub_date, comment.pk)):
+        comments[comment.post_id].append(comment)
+    return comments
+
+
+def attach_latest_comments(posts, amount=None):
+    """Даёт каждому посту атрибут latest_comments. Запрос выполняется
+    при первом обращении к любому из них: если фрагмент ленты взят из
+    кэша, запроса нет совсем."""
+    amount = amount or settings.COMMENTS_PREVIEW_AMOUNT
+    preview = SimpleLazyObject(
+        lambda: latest_comments([post.pk for post in posts], amount))
+    for post in posts:
+        post.latest_comments = SimpleLazyObject(
+            lambda post_id=post.pk: preview.get(post_id, []))
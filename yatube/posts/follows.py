@@ -0,0 +1,39 @@
+"""Подписка и отписка одним запросом, без гонок между кликами.
+
+Повторную подписку отсекает уникальный индекс (user, author), а не
+проверка exists() перед create(), поэтому два одновременных запроса
+не создадут дубль и не сдвинут счётчики дважды. Сигналы при записи
+мимо ORM не приходят, последствия вызываются явно и только если
+строка действительно добавилась или удалилась.
+"""
+from django.db import connection, transaction
+
+from .models import Follow
+from .signals import follow_added, follow_removed
+
+
+def follow(user, author):
+    """Подписывает user на author. True, если подписка появилась;
+    на себя и повторно подписаться нельзя."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {Follow._meta.db_table} (user_id, author_id) '
+            'SELECT %s, %s WHERE %s <> %s ON CONFLICT DO NOTHING',
+            (user.pk, author.pk, user.pk, author.pk))
+        created = cursor.rowcount == 1
+        if created:
+            follow_added(user.pk, author.pk)
+    return created
+
+
+def unfollow(user, author):
+    """Отписывает user от author. True, если подписка была."""
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {Follow._meta.db_table} '
+            'WHERE user_id = %s AND author_id = %s',
+            (user.pk, author.pk))
+        deleted = cursor.rowcount == 1
+        if deleted:
+            follow_removed(user.pk, author.pk)
+    return deleted
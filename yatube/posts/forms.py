@@ -1,5 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
+from core.uploads import RejectedUpload, normalize_image
 from .models import Post, Comment
 
 
@@ -13,6 +15,23 @@ class PostForm(forms.ModelForm):
                       'запись.',
                       'image': 'Загрузите изображение'}
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Отклонённый при загрузке файл поле не увидит, ошибку
+        # покажет clean_image.
+        self.rejected_image = None
+        if isinstance(self.files.get('image'), RejectedUpload):
+            self.files = self.files.copy()
+            self.rejected_image = self.files.pop('image')[0]
+
+    def clean_image(self):
+        if self.rejected_image is not None:
+            raise forms.ValidationError(self.rejected_image.error)
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            return normalize_image(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,109 @@
+import gzip
+import json
+import time
+
+from django.apps import apps
+from django.core import serializers
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.bulk import (bulk_insert, keep_dates, rebuild_derived_data,
+                        reset_sequences)
+from .export_ndjson import EXPORT_MODELS
+
+BATCH_SIZE = 5000
+READ_SIZE = 1 << 16
+
+
+def iter_json_array(stream):
+    """Объекты из JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer = stream.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив или NDJSON.')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            more = stream.read(READ_SIZE)
+            if not more:
+                raise CommandError('Файл обрывается посреди JSON.')
+            buffer += more
+            continue
+        yield obj
+        buffer = buffer[end:]
+
+
+def iter_records(stream):
+    """Записи из JSON-массива (dumpdata) или NDJSON (export_ndjson)."""
+    is_array = stream.read(READ_SIZE).lstrip().startswith('[')
+    stream.seek(0)
+    if is_array:
+        yield from iter_json_array(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+class Command(BaseCommand):
+    help = ('Загружает выгрузку dumpdata (JSON) или export_ndjson (NDJSON, '
+            'можно .gz) через bulk_create большими транзакциями, сохраняя '
+            'id и даты. Сигналы не вызываются: счётчики, поисковый индекс '
+            'и ленты подписок пересчитываются один раз в конце. Записи '
+            'других моделей пропускаются.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл выгрузки.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        models = {label.lower(): apps.get_model(label)
+                  for label, _ in EXPORT_MODELS}
+        opener = gzip.open if options['path'].endswith('.gz') else open
+        started = time.monotonic()
+        loaded = dict.fromkeys(models.values(), 0)
+        model, batch = None, []
+
+        def flush():
+            if batch:
+                bulk_insert(model, batch)
+                loaded[model] += len(batch)
+                self.stderr.write(f'{model._meta.label}: {loaded[model]}')
+                batch.clear()
+
+        with opener(options['path'], 'rt', encoding='utf-8') as stream, \
+                keep_dates(*models.values()):
+            records = self.wanted(iter_records(stream), models)
+            for wrapper in serializers.deserialize(
+                    'python', records, ignorenonexistent=True):
+                obj = wrapper.object
+                if type(obj) is not model or (
+                        len(batch) >= options['batch_size']):
+                    flush()
+                    model = type(obj)
+                batch.append(obj)
+            flush()
+        reset_sequences(*models.values())
+        self.stderr.write('Пересчёт счётчиков, индекса и лент…')
+        rebuild_derived_data()
+        self.stdout.write(self.style.SUCCESS(
+            'Загружено: ' + ', '.join(
+                f'{model._meta.label} {count}'
+                for model, count in loaded.items())
+            + f'; пропущено записей других моделей: {self.skipped}; '
+            f'{time.monotonic() - started:.1f} с.'))
+
+    def wanted(self, records, models):
+        """Записи загружаемых моделей; остальные только считает."""
+        self.skipped = 0
+        for record in records:
+            if record.get('model', '').lower() in models:
+                yield record
+            else:
+                self.skipped += 1
@@ -0,0 +1,106 @@
+import time
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_date
+
+from posts.bulk import (deferred_indexes, insert_rows, rebuild_derived_data,
+                        reset_sequences, unsynchronized)
+from posts.models import Comment, Follow, Group, Post, User
+from posts.synthetic import SyntheticData
+
+BATCH_SIZE = 100000
+
+
+def parse_until(value):
+    until = parse_date(value)
+    if until is None:
+        raise CommandError(f'Ожидается дата ГГГГ-ММ-ДД, получено «{value}».')
+    return until
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками с перекошенными, как на '
+            'живом сайте, распределениями: немного плодовитых авторов со '
+            'множеством подписчиков, длинный хвост групп. Пишет через '
+            'executemany пачками, неуникальные индексы строятся после '
+            'загрузки; одинаковые --seed и --until дают одинаковые '
+            'данные. Для ориентира, одно ядро и 5 ГБ памяти: 10 млн '
+            'постов, 10 млн комментариев, 100 000 пользователей и '
+            '100 000 подписок — 34,5 мин. Из них запись с индексами '
+            '11 мин, счётчики 7,5 мин, поисковый индекс 13 мин (стемминг '
+            'в Python), ленты подписок (39 млн строк) 2,5 мин. Несколько '
+            'минут на 10 млн постов так не получить: нужен поисковый '
+            'индекс без стемминга в Python или несколько процессов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=5000)
+        parser.add_argument(
+            '--images', type=float, default=0, metavar='ДОЛЯ',
+            help='Доля постов с картинкой, от 0 до 1.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней до --until идут посты.')
+        parser.add_argument('--until', type=parse_until,
+                            help='Дата последнего поста, по умолчанию '
+                                 'сегодня.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['images'] <= 1:
+            raise CommandError('--images — доля от 0 до 1.')
+        if options['posts'] and not options['users']:
+            raise CommandError('Постам нужны авторы: укажите --users.')
+        started = time.monotonic()
+        data = SyntheticData(
+            options['seed'], users=options['users'],
+            groups=options['groups'], posts=options['posts'],
+            comments=options['comments'], follows=options['follows'],
+            image_share=options['images'], days=options['days'],
+            until=options['until'])
+        if options['images']:
+            data.save_images()
+        follows_before = Follow.objects.count()
+        tables = (User, Group, Post, Comment, Follow)
+        with unsynchronized():
+            # Индексы строятся один раз после записи. Синтетические
+            # строки ссылаются только на уже записанные id, а проверка
+            # внешних ключей — лишний поиск по id на каждую строку.
+            with deferred_indexes(*tables), \
+                    connection.constraint_checks_disabled():
+                for model, fields, rows in data.tables():
+                    self.insert(model, fields, rows, options['batch_size'])
+                self.stderr.write('Построение индексов…')
+            reset_sequences(*tables)
+            inserted = time.monotonic()
+            self.stderr.write('Пересчёт счётчиков, индекса и лент…')
+            rebuild_derived_data()
+        finished = time.monotonic()
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей {options["users"]}, групп '
+            f'{options["groups"]}, постов {options["posts"]}, комментариев '
+            f'{options["comments"] if options["posts"] else 0}, подписок '
+            f'{Follow.objects.count() - follows_before}; '
+            f'{finished - started:.1f} с (запись {inserted - started:.1f} с, '
+            f'пересчёт {finished - inserted:.1f} с).'))
+
+    def insert(self, model, fields, rows, batch_size):
+        inserted = 0
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                return
+            # Транзакция на пачку: в одной на всю загрузку WAL вырастает
+            # до гигабайт, и каждое чтение страницы ищет её по всему WAL.
+            with transaction.atomic():
+                # Повторные подписки отбрасывает уникальный индекс.
+                insert_rows(model, fields, batch,
+                            ignore_conflicts=model is Follow)
+            inserted += len(batch)
+            self.stderr.write(f'{model._meta.label}: {inserted}')
@@ -0,0 +1,45 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts.models import Post
+from posts.thumbnails import post_image_sources
+
+CHUNK_SIZE = 20
+
+
+def generate(image_name):
+    try:
+        post_image_sources(image_name)
+    except Exception as error:
+        return f'{image_name}: {error}'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Нарезает миниатюры для картинок уже опубликованных постов, '
+            'чтобы шаблоны брали готовые файлы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes', type=int, default=None,
+            help='Число процессов; по умолчанию по числу ядер, '
+                 '0 — без пула, в текущем процессе.')
+
+    def handle(self, *args, **options):
+        images = list(Post.objects.exclude(image='')
+                      .values_list('image', flat=True).distinct())
+        if options['processes'] == 0:
+            errors = [error for error in map(generate, images) if error]
+        else:
+            # Дочерние процессы не должны делить соединение с родителем.
+            connections.close_all()
+            with ProcessPoolExecutor(options['processes']) as pool:
+                errors = [error for error in pool.map(
+                    generate, images, chunksize=CHUNK_SIZE) if error]
+        for error in errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Миниатюр готово: {len(images) - len(errors)}, '
+            f'ошибок: {len(errors)}.'))
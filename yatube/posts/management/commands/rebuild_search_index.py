@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import Post, PostSearchIndex
+from posts.search import rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает полнотекстовый индекс постов, например после '
+            'загрузки постов в обход сигналов.')
+
+    def handle(self, *args, **options):
+        indexed = rebuild_search_index(Post, PostSearchIndex)
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {indexed}.'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_comment_counts, reconcile_user_stats
+from posts.models import Comment, Follow, Post, User, UserStats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, подписчиков '
+            'и комментариев там, где они разошлись с данными.')
+
+    def handle(self, *args, **options):
+        users_fixed = reconcile_user_stats(User, UserStats, Post, Follow)
+        posts_fixed = reconcile_comment_counts(Post, Comment)
+        self.stdout.write(self.style.SUCCESS(
+            f'Исправлено счётчиков пользователей: {users_fixed}, '
+            f'постов: {posts_fixed}.'))
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+def fill_counters(apps, schema_editor):
+    """Счётчики по уже накопленным данным. Только что созданные строки
+    и столбец пусты, поэтому достаточно посчитать всё заново."""
+    users = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    stats = apps.get_model('posts', 'UserStats')._meta.db_table
+    posts = apps.get_model('posts', 'Post')._meta.db_table
+    follows = apps.get_model('posts', 'Follow')._meta.db_table
+    comments = apps.get_model('posts', 'Comment')._meta.db_table
+    schema_editor.execute(
+        f'INSERT INTO {stats} '
+        '(user_id, posts_count, followers_count, following_count) '
+        'SELECT u.id, '
+        f'(SELECT COUNT(*) FROM {posts} WHERE author_id = u.id), '
+        f'(SELECT COUNT(*) FROM {follows} WHERE author_id = u.id), '
+        f'(SELECT COUNT(*) FROM {follows} WHERE user_id = u.id) '
+        f'FROM {users} u')
+    schema_editor.execute(
+        f'UPDATE {posts} SET comments_count = '
+        f'(SELECT COUNT(*) FROM {comments} '
+        f'WHERE post_id = {posts}.id)')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_timelineentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Публикаций')),
+                ('followers_count', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+            ],
+            options={
+                'verbose_name': 'Счётчики пользователя',
+                'verbose_name_plural': 'Счётчики пользователей',
+            },
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
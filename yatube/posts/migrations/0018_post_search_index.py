@@ -0,0 +1,138 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+import posts.models
+import re
+from functools import lru_cache
+
+# Копия стеммера из posts.search на момент миграции: миграция не должна
+# зависеть от того, как код приложения изменится потом.
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile(r'[а-я]+')
+
+VOWELS = 'аеиоуыэюя'
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+REFLEXIVE = ((), ('ся', 'сь'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейше', 'ейш'))
+DERIVATIONAL = ((), ('ость', 'ост'))
+
+
+def _ending(word, endings):
+    """Самое длинное окончание из endings, которым кончается word.
+    Окончания первой группы засчитываются только после «а» или «я»."""
+    after_a, anywhere = endings
+    for ending in sorted(after_a + anywhere, key=len, reverse=True):
+        if word.endswith(ending):
+            if ending in anywhere or word[:-len(ending)][-1:] in ('а', 'я'):
+                return ending
+            return ''
+    return ''
+
+
+def _cut(word, endings):
+    ending = _ending(word, endings)
+    return (word[:-len(ending)], True) if ending else (word, False)
+
+
+def _region_after(word, start):
+    """Начало области после первой согласной, стоящей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+@lru_cache(maxsize=50000)
+def stem(word):
+    """Основа слова по алгоритму Snowball для русского языка.
+    Слова не на кириллице только приводятся к нижнему регистру."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC_RE.fullmatch(word):
+        return word
+    rv = next((index + 1 for index, letter in enumerate(word)
+               if letter in VOWELS), len(word))
+    r2 = _region_after(word, _region_after(word, 0)) - rv
+    prefix, word = word[:rv], word[rv:]
+
+    word, found = _cut(word, PERFECTIVE_GERUND)
+    if not found:
+        word, _ = _cut(word, REFLEXIVE)
+        word, found = _cut(word, ADJECTIVE)
+        if found:
+            word, _ = _cut(word, PARTICIPLE)
+        else:
+            word, found = _cut(word, VERB)
+            if not found:
+                word, _ = _cut(word, NOUN)
+    if word.endswith('и'):
+        word = word[:-1]
+    ending = _ending(word, DERIVATIONAL)
+    if ending and len(word) - len(ending) >= r2:
+        word = word[:-len(ending)]
+    if word.endswith('нн'):
+        word = word[:-1]
+    else:
+        word, found = _cut(word, SUPERLATIVE)
+        if found and word.endswith('нн'):
+            word = word[:-1]
+        elif not found and word.endswith('ь'):
+            word = word[:-1]
+    return prefix + word
+
+
+def stems_of(text):
+    return [stem(word) for word in WORD_RE.findall(text)]
+
+
+def fill_search_index(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    PostSearchIndex = apps.get_model('posts', 'PostSearchIndex')
+    PostSearchIndex.objects.bulk_create(
+        (PostSearchIndex(post_id=post_id, stems=' '.join(stems_of(text)))
+         for post_id, text in Post.objects.values_list(
+             'id', 'text').iterator()),
+        batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostSearchIndex',
+            fields=[
+                ('post', models.OneToOneField(db_column='rowid', on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='+', serialize=False, to='posts.Post')),
+                ('stems', posts.models.FullTextField(verbose_name='Основы слов')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс поста',
+                'verbose_name_plural': 'Поисковый индекс постов',
+                'db_table': 'posts_post_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunSQL(
+            """CREATE VIRTUAL TABLE posts_post_fts USING fts5(
+                   stems, tokenize = 'unicode61 remove_diacritics 2')""",
+            'DROP TABLE posts_post_fts',
+        ),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_post_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['title'], name='group_title_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.expressions import RawSQL
 from django.contrib.auth import get_user_model
 from django.conf import settings
 
@@ -23,6 +24,10 @@ class Group(models.Model):
         return self.title
 
     class Meta:
+        # Поиск групп в админке идёт по началу названия (core.admin).
+        indexes = (
+            models.Index(fields=('title',), name='group_title_idx'),
+        )
         verbose_name = "Группу"
         verbose_name_plural = "Группы"
 
@@ -46,12 +51,38 @@ class Post(CreatedModel):
         'Картинка',
         upload_to='posts/',
         blank=True)
+    comments_count = models.PositiveIntegerField('Комментариев',
+                                                 default=0,
+                                                 editable=False,)
 
     def __str__(self):
         return self.text[:settings.POST_TEXT_SHORT]
 
+    def save(self, *args, **kwargs):
+        # comments_count сдвигается только через F() (см. posts.signals):
+        # сохранение без update_fields не пишет значение, прочитанное
+        # в начале запроса, иначе комментарии, добавленные за это время,
+        # потеряются. Явный update_fields вызывающего берётся как есть,
+        # в том числе с comments_count.
+        updating_all = (not self._state.adding
+                        and not kwargs.get('force_insert')
+                        and kwargs.get('update_fields') is None)
+        if updating_all:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'comments_count']
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('pub_date',),
+                         name='post_pub_date_idx'),
+            models.Index(fields=('author', 'pub_date'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', 'pub_date'),
+                         name='post_group_pub_date_idx'),
+        )
         verbose_name = "Публикацию"
         verbose_name_plural = "Публикации"
 
@@ -70,6 +101,10 @@ class Comment(CreatedModel):
 
     class Meta:
         ordering = ('pub_date',)
+        indexes = (
+            models.Index(fields=('post', 'pub_date'),
+                         name='comment_post_pub_date_idx'),
+        )
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
 
@@ -85,5 +120,102 @@ class Follow(models.Model):
                                on_delete=models.CASCADE,)
 
     class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+        )
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты подписок: пост автора, на которого подписан user.
+
+    Заполняется при записи (см. posts.signals), поэтому страница
+    follow_index читается одним диапазоном по индексу (user, pub_date).
+    """
+    user = models.ForeignKey(User,
+                             verbose_name='Читатель',
+                             related_name='timeline',
+                             on_delete=models.CASCADE,)
+    post = models.ForeignKey(Post,
+                             verbose_name='Пост',
+                             related_name='timeline_entries',
+                             on_delete=models.CASCADE,)
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        # pub_date однозначно задаётся постом, поэтому уникальный индекс
+        # (user, pub_date, post) и запрещает дубли, и отдаёт ленту
+        # в порядке сортировки.
+        constraints = (
+            models.UniqueConstraint(fields=('user', 'pub_date', 'post'),
+                                    name='unique_timeline_entry'),
+        )
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Лента подписок'
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя. Обновляются через F() при записи
+    (см. posts.signals), расхождения чинит команда reconcile_counters."""
+    user = models.OneToOneField(User,
+                                primary_key=True,
+                                verbose_name='Пользователь',
+                                related_name='stats',
+                                on_delete=models.CASCADE,)
+    posts_count = models.PositiveIntegerField('Публикаций', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+
+class Match(models.Lookup):
+    """stems__match='…' — условие MATCH полнотекстового индекса FTS5."""
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class FullTextField(models.TextField):
+    """Колонка виртуальной таблицы FTS5, поддерживает lookup match."""
+
+
+FullTextField.register_lookup(Match)
+
+
+class PostSearchQuerySet(models.QuerySet):
+    def search(self, match):
+        """Строки индекса, подходящие под запрос FTS5 match, с оценкой
+        score = -bm25: чем больше, тем выше в выдаче."""
+        return self.filter(stems__match=match).annotate(
+            score=RawSQL(f'-bm25("{self.model._meta.db_table}")', ()))
+
+
+class PostSearchIndex(models.Model):
+    """Строка полнотекстового индекса постов (см. posts.search).
+
+    Виртуальную таблицу FTS5 создаёт миграция, rowid строки совпадает
+    с id поста. Индекс обновляется сигналами при записи поста, целиком
+    его пересобирает команда rebuild_search_index.
+    """
+    post = models.OneToOneField(Post,
+                                primary_key=True,
+                                db_column='rowid',
+                                related_name='+',
+                                on_delete=models.DO_NOTHING,)
+    stems = FullTextField('Основы слов')
+
+    objects = PostSearchQuerySet.as_manager()
+
+    class Meta:
+        managed = False
+        db_table = 'posts_post_fts'
+        verbose_name = 'Поисковый индекс поста'
+        verbose_name_plural = 'Поисковый индекс постов'
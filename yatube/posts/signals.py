@@ -0,0 +1,308 @@
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from core.jobs import job
+
+from .caching import (FEED_AUTHOR, FEED_FOLLOWER, FEED_GLOBAL, FEED_GROUP,
+                      bump_feed_versions, feed_name, invalidate_feed_counts,
+                      invalidate_followed_authors)
+from .counters import change_counters
+from .models import (Comment, Follow, Group, Post, TimelineEntry, User,
+                     UserStats)
+from .search import index_post, unindex_post
+from .thumbnails import schedule_post_thumbnails
+
+# Поля пользователя, которые выводятся в карточках постов и комментариев.
+USER_DISPLAY_FIELDS = ('username', 'first_name', 'last_name')
+# Больше 500 строк в одном INSERT SQLite не принимает
+# (SQLITE_MAX_COMPOUND_SELECT), а Django 2.2 явный batch_size не урезает.
+TIMELINE_BATCH_SIZE = 500
+FAN_OUT_JOB_PRIORITY = 10
+
+
+def followers_of(author_id):
+    return list(Follow.objects.filter(author_id=author_id)
+                .values_list('user_id', flat=True))
+
+
+@job(priority=FAN_OUT_JOB_PRIORITY)
+def fan_out_post(post_id):
+    """Кладёт новый пост в ленты всех подписчиков автора и сбрасывает
+    кэш этих лент. Подписавшихся позже добавит backfill_timeline."""
+    post = Post.objects.filter(pk=post_id).only('author', 'pub_date').first()
+    if post is None:
+        return
+    followers = followers_of(post.author_id)
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True)
+    if followers:
+        feeds = [feed_name(FEED_FOLLOWER, user_id) for user_id in followers]
+        invalidate_feed_counts(*feeds)
+        bump_feed_versions(*feeds)
+
+
+@job(priority=FAN_OUT_JOB_PRIORITY)
+def bump_follower_feeds(author_id):
+    """Сбрасывает кэш лент подписчиков автора, когда изменился его пост
+    или комментарии к нему. Подписчиков бывает много, поэтому не в
+    запросе."""
+    bump_feed_versions(*(feed_name(FEED_FOLLOWER, user_id)
+                         for user_id in followers_of(author_id)))
+
+
+def bump_post_list_feeds(posts):
+    """Сбрасывает кэш всех лент, где выводятся посты из queryset posts:
+    общей, групп, авторов и подписчиков этих авторов."""
+    posts = posts.order_by()
+    authors = posts.values_list('author_id', flat=True).distinct()
+    groups = (posts.filter(group__isnull=False)
+              .values_list('group_id', flat=True).distinct())
+    followers = (Follow.objects.filter(author_id__in=authors).order_by()
+                 .values_list('user_id', flat=True).distinct())
+    bump_feed_versions(
+        FEED_GLOBAL,
+        *(feed_name(FEED_GROUP, group_id) for group_id in groups),
+        *(feed_name(FEED_AUTHOR, author_id) for author_id in authors),
+        *(feed_name(FEED_FOLLOWER, user_id) for user_id in followers))
+
+
+@job(priority=FAN_OUT_JOB_PRIORITY)
+def bump_group_feeds(group_id):
+    """Сбрасывает кэш лент с постами группы после правки группы: в
+    карточках есть ссылка на неё."""
+    bump_post_list_feeds(Post.objects.filter(group_id=group_id))
+
+
+@job(priority=FAN_OUT_JOB_PRIORITY)
+def bump_user_feeds(user_id):
+    """Сбрасывает кэш лент с постами и комментариями пользователя после
+    смены его имени."""
+    bump_post_list_feeds(Post.objects.filter(
+        Q(author_id=user_id) | Q(comments__author_id=user_id)))
+
+
+@job(priority=FAN_OUT_JOB_PRIORITY)
+def backfill_timeline(user_id, author_id):
+    """Добавляет в ленту подписчика все посты автора, если подписка ещё
+    есть: задача могла дождаться очереди уже после отписки. Проверка и
+    вставка — один запрос, поэтому с purge_timeline они не перемешаются."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, pub_date) '
+            f'SELECT %s, post.id, post.pub_date FROM {Post._meta.db_table} '
+            'post WHERE post.author_id = %s AND EXISTS ('
+            f'SELECT 1 FROM {Follow._meta.db_table} '
+            'WHERE user_id = %s AND author_id = %s)',
+            (user_id, author_id, user_id, author_id))
+    invalidate_follower_feed(user_id)
+
+
+def rebuild_timelines():
+    """Заполняет ленты подписок по всем подпискам одним INSERT ... SELECT,
+    уже существующие записи пропускает. Для массовой загрузки данных,
+    мимо сигналов. Строки идут в порядке уникального индекса (user,
+    pub_date, post), поэтому индекс растёт с конца, а не вразброс:
+    на 2,4 млн строк это 19 с вместо 27."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR IGNORE INTO {TimelineEntry._meta.db_table} '
+            '(user_id, post_id, pub_date) '
+            'SELECT follow.user_id, post.id, post.pub_date '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            'ON post.author_id = follow.author_id '
+            'ORDER BY follow.user_id, post.pub_date, post.id')
+
+
+@job(priority=FAN_OUT_JOB_PRIORITY)
+def purge_timeline(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, если он не подписался
+    снова, пока задача ждала очереди."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TimelineEntry._meta.db_table} '
+            'WHERE user_id = %s AND post_id IN ('
+            f'SELECT id FROM {Post._meta.db_table} WHERE author_id = %s) '
+            f'AND NOT EXISTS (SELECT 1 FROM {Follow._meta.db_table} '
+            'WHERE user_id = %s AND author_id = %s)',
+            (user_id, author_id, user_id, author_id))
+    invalidate_follower_feed(user_id)
+
+
+def change_user_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя; строку счётчиков создаёт только
+    при увеличении, чтобы не воскрешать её при каскадном удалении."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if not change_counters(stats, **deltas) and min(deltas.values()) > 0:
+        UserStats.objects.get_or_create(user_id=user_id)
+        change_counters(stats, **deltas)
+
+
+def post_feeds(post, followers=None, group_ids=()):
+    """Ленты, в которые попадает пост."""
+    if followers is None:
+        followers = followers_of(post.author_id)
+    return [
+        FEED_GLOBAL,
+        feed_name(FEED_AUTHOR, post.author_id),
+        *(feed_name(FEED_GROUP, group_id)
+          for group_id in {post.group_id, *group_ids} if group_id),
+        *(feed_name(FEED_FOLLOWER, user_id) for user_id in followers),
+    ]
+
+
+def invalidate_post_feeds(post, followers=None, group_ids=(), counts=True):
+    """Переводит ленты поста в новое поколение кэша и, если состав
+    лент изменился, сбрасывает их размеры."""
+    feeds = post_feeds(post, followers, group_ids)
+    if counts:
+        invalidate_feed_counts(*feeds)
+    bump_feed_versions(*feeds)
+
+
+def invalidate_follower_feed(user_id):
+    feed = feed_name(FEED_FOLLOWER, user_id)
+    invalidate_feed_counts(feed)
+    bump_feed_versions(feed)
+
+
+@receiver(pre_save, sender=User)
+def user_changing(sender, instance, raw=False, update_fields=None,
+                  **kwargs):
+    # Вход в систему пишет только last_login: лишнего запроса не нужно.
+    if (instance.pk and not raw and (
+            update_fields is None
+            or set(update_fields) & set(USER_DISPLAY_FIELDS))):
+        instance.previous_display = (
+            User.objects.filter(pk=instance.pk)
+            .values_list(*USER_DISPLAY_FIELDS).first())
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, raw=False, **kwargs):
+    previous = instance.__dict__.pop('previous_display', None)
+    if created or raw or previous is None or previous == tuple(
+            getattr(instance, field) for field in USER_DISPLAY_FIELDS):
+        return
+    # Профиль и общая лента сразу, остальные ленты — задачей.
+    bump_feed_versions(FEED_GLOBAL, feed_name(FEED_AUTHOR, instance.pk))
+    bump_user_feeds.enqueue(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    if created or raw:
+        return
+    bump_feed_versions(FEED_GLOBAL, feed_name(FEED_GROUP, instance.pk))
+    bump_group_feeds.enqueue(instance.pk)
+
+
+@receiver(pre_save, sender=Post)
+def post_changing(sender, instance, raw=False, **kwargs):
+    if instance.pk and not raw:
+        instance.previous_group_id, instance.previous_image = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list('group_id', 'image').first() or (None, ''))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    index_post(instance)
+    if raw:
+        return
+    if created:
+        change_user_stats(instance.author_id, posts_count=1)
+        # Ленты подписчиков обновит задача, запрос её не ждёт.
+        invalidate_post_feeds(instance, followers=())
+        fan_out_post.enqueue(instance.pk,
+                             dedup_key=f'fan_out_post:{instance.pk}')
+    else:
+        invalidate_post_feeds(
+            instance, followers=(), group_ids=(instance.previous_group_id,),
+            counts=instance.previous_group_id != instance.group_id)
+        bump_follower_feeds.enqueue(instance.author_id)
+    if instance.image and (
+            created or instance.image.name != instance.previous_image):
+        schedule_post_thumbnails(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    unindex_post(instance.pk)
+    change_user_stats(instance.author_id, posts_count=-1)
+    invalidate_post_feeds(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counters(Post.objects.filter(pk=instance.post_id),
+                        comments_count=1)
+        invalidate_post_feeds(instance.post, followers=(), counts=False)
+        bump_follower_feeds.enqueue(instance.post.author_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    post = Post.objects.filter(pk=instance.post_id).first()
+    if post is not None:
+        change_counters(Post.objects.filter(pk=post.pk), comments_count=-1)
+        invalidate_post_feeds(post, followers=(), counts=False)
+        bump_follower_feeds.enqueue(post.author_id)
+
+
+def invalidate_follow_caches(user_id, author_id):
+    """Кэши, которые меняет подписка: лента подписок и множество авторов
+    подписчика, а также профили обоих, где выведены счётчики подписок.
+    Сбрасываются после коммита: иначе параллельный запрос успеет
+    закэшировать старый набор подписок уже под новой версией."""
+    invalidate_follower_feed(user_id)
+    invalidate_followed_authors(user_id)
+    bump_feed_versions(feed_name(FEED_AUTHOR, user_id),
+                       feed_name(FEED_AUTHOR, author_id))
+
+
+def follow_added(user_id, author_id):
+    """Всё, что меняет новая подписка: счётчики, лента подписок, кэши.
+    Вызывается сигналом и posts.follows.follow, который пишет мимо save()."""
+    change_user_stats(user_id, following_count=1)
+    change_user_stats(author_id, followers_count=1)
+    # Постов у автора может быть много: ленту заполнит задача.
+    backfill_timeline.enqueue(
+        user_id, author_id,
+        dedup_key=f'backfill_timeline:{user_id}:{author_id}')
+    transaction.on_commit(
+        lambda: invalidate_follow_caches(user_id, author_id))
+
+
+def follow_removed(user_id, author_id):
+    change_user_stats(user_id, following_count=-1)
+    change_user_stats(author_id, followers_count=-1)
+    purge_timeline.enqueue(
+        user_id, author_id,
+        dedup_key=f'purge_timeline:{user_id}:{author_id}')
+    transaction.on_commit(
+        lambda: invalidate_follow_caches(user_id, author_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        follow_added(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    follow_removed(instance.user_id, instance.author_id)
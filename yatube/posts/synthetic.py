@@ -0,0 +1,161 @@
+"""Синтетические данные для проверки на больших объёмах (generate_data)."""
+import io
+import random
+from datetime import datetime, time, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from .models import Comment, Follow, Group, Post, User
+from .thumbnails import POST_THUMBNAIL_RATIO
+
+# Faker медленный, поэтому тексты и имена собираются из заранее
+# сгенерированных наборов.
+POOL_SIZE = 1000
+IMAGES_AMOUNT = 20
+NO_GROUP_SHARE = 0.3
+# Перекос распределений (см. skewed_index): авторы постов, группы,
+# авторы, на которых подписываются, и посты, которые комментируют.
+AUTHOR_SKEW = 2
+GROUP_SKEW = 2
+FOLLOW_SKEW = 2
+COMMENT_SKEW = 2
+
+
+def skewed_index(rng, size, skew):
+    """Индекс из range(size) по степенному закону:
+    P(index < x) = (x / size) ** (1 / skew). При skew=1 распределение
+    равномерное, с ростом skew почти всё достаётся первым индексам."""
+    return min(int(size * rng.random() ** skew), size - 1)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+
+class SyntheticData:
+    """Строки пользователей, групп, постов, комментариев и подписок.
+
+    Всё выводится из seed и until, поэтому одинаковые параметры на той
+    же базе дают одинаковые данные. Новые объекты получают явные id
+    после уже существующих, связи считаются по этим id без запросов.
+    Строки — кортежи значений полей FIELDS без объектов моделей: их
+    сразу можно отдавать в bulk.insert_rows.
+    """
+
+    FIELDS = {
+        User: ('id', 'username', 'password', 'first_name', 'last_name',
+               'date_joined'),
+        Group: ('id', 'title', 'slug', 'description'),
+        Post: ('id', 'author_id', 'group_id', 'image', 'text', 'pub_date'),
+        Comment: ('id', 'post_id', 'author_id', 'text', 'pub_date'),
+        Follow: ('user_id', 'author_id'),
+    }
+
+    def __init__(self, seed, users, groups, posts, comments, follows,
+                 image_share=0, days=365, until=None):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.seed = seed
+        self.amounts = {User: users, Group: groups, Post: posts,
+                        Comment: comments, Follow: follows}
+        self.first_ids = {model: next_id(model) for model in self.amounts}
+        self.image_share = image_share
+        self.image_names = []
+        # Период заканчивается в конце дня until.
+        until = (until or timezone.localdate()) + timedelta(days=1)
+        self.end = timezone.make_aware(datetime.combine(until, time.min))
+        self.span = timedelta(days=days)
+        self.sentences = [self.fake.sentence(nb_words=12)
+                          for _ in range(POOL_SIZE)]
+        self.words = [self.fake.word() for _ in range(POOL_SIZE)]
+        self.names = [(self.fake.first_name(), self.fake.last_name(),
+                       self.fake.user_name()) for _ in range(POOL_SIZE)]
+
+    def text(self, sentences=6):
+        return ' '.join(self.rng.choices(
+            self.sentences, k=self.rng.randint(1, sentences)))
+
+    def post_date(self, index):
+        """Посты равномерно распределены по периоду: id растут вместе
+        с датой, как при обычной работе сайта."""
+        return self.end - self.span * (1 - index / self.amounts[Post])
+
+    def user_id(self, skew=1):
+        return self.first_ids[User] + skewed_index(
+            self.rng, self.amounts[User], skew)
+
+    def save_images(self):
+        """Небольшой набор картинок для постов, сохраняется в хранилище
+        один раз. Миниатюры сделает generate_thumbnails."""
+        width, height = POST_THUMBNAIL_RATIO
+        for number in range(IMAGES_AMOUNT):
+            colors = [tuple(self.rng.randrange(256) for _ in range(3))
+                      for _ in range(2)]
+            image = Image.new('RGB', (width, height), colors[0])
+            image.paste(colors[1], (0, height // 2, width, height))
+            content = io.BytesIO()
+            image.save(content, 'JPEG', quality=80)
+            self.image_names.append(default_storage.save(
+                f'posts/synthetic-{self.seed}-{number}.jpg',
+                ContentFile(content.getvalue())))
+
+    def users(self):
+        password = make_password(None)
+        for index in range(self.amounts[User]):
+            pk = self.first_ids[User] + index
+            first_name, last_name, username = self.rng.choice(self.names)
+            yield (pk, f'{username}_{pk}', password, first_name, last_name,
+                   self.end - self.span * (1 + self.rng.random()))
+
+    def groups(self):
+        for index in range(self.amounts[Group]):
+            pk = self.first_ids[Group] + index
+            title = ' '.join(self.rng.choices(self.words, k=2))
+            yield pk, title.capitalize(), f'group-{pk}', self.text(2)
+
+    def posts(self):
+        for index in range(self.amounts[Post]):
+            group_id = None
+            if self.amounts[Group] and self.rng.random() >= NO_GROUP_SHARE:
+                group_id = self.first_ids[Group] + skewed_index(
+                    self.rng, self.amounts[Group], GROUP_SKEW)
+            image = ''
+            if self.image_names and self.rng.random() < self.image_share:
+                image = self.rng.choice(self.image_names)
+            yield (self.first_ids[Post] + index, self.user_id(AUTHOR_SKEW),
+                   group_id, image, self.text(), self.post_date(index))
+
+    def comments(self):
+        """Чаще комментируют свежие посты."""
+        posts = self.amounts[Post]
+        for index in range(self.amounts[Comment] if posts else 0):
+            post = posts - 1 - skewed_index(self.rng, posts, COMMENT_SKEW)
+            pub_date = self.post_date(post)
+            yield (self.first_ids[Comment] + index,
+                   self.first_ids[Post] + post, self.user_id(), self.text(2),
+                   pub_date + (self.end - pub_date) * self.rng.random())
+
+    def follows(self):
+        """Подписчик выбирается равномерно, автор — с тем же перекосом,
+        что у числа постов: у плодовитых авторов больше подписчиков.
+        Повторы и подписки на себя отбрасываются, поэтому подписок
+        может получиться меньше запрошенного."""
+        for _ in range(self.amounts[Follow] if self.amounts[User] else 0):
+            user_id, author_id = self.user_id(), self.user_id(FOLLOW_SKEW)
+            if user_id != author_id:
+                yield user_id, author_id
+
+    def tables(self):
+        """Тройки (модель, поля, строки) в порядке, пригодном для
+        загрузки."""
+        return ((model, self.FIELDS[model], rows) for model, rows in (
+            (User, self.users()), (Group, self.groups()),
+            (Post, self.posts()), (Comment, self.comments()),
+            (Follow, self.follows())))
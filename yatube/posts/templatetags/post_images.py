@@ -0,0 +1,35 @@
+import logging
+
+from django import template
+
+from posts.thumbnails import stored_post_image_sources
+
+logger = logging.getLogger(__name__)
+
+register = template.Library()
+
+IMAGE_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+
+
+@register.inclusion_tag('posts/includes/post_image.html')
+def post_image(image, sizes='100vw'):
+    """<picture> с вариантами миниатюры поста по ширине и формату.
+    Браузер сам выбирает ширину по sizes и WebP, если его понимает.
+    Миниатюры шаблон не режет: пока их нет, выводится оригинал."""
+    if not image:
+        return {}
+    try:
+        sources = stored_post_image_sources(image.name)
+    except Exception:
+        logger.exception('Нет миниатюр для %s', image.name)
+        sources = None
+    if sources is None:
+        return {'sources': [], 'src': image.url, 'sizes': sizes}
+    return {
+        'sources': [
+            {'type': IMAGE_TYPES[image_format], 'srcset': srcset}
+            for image_format, srcset in sources['srcsets']
+        ],
+        'src': sources['src'],
+        'sizes': sizes,
+    }
@@ -0,0 +1,115 @@
+import re
+from http import HTTPStatus
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+ROWS_AMOUNT = 15
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?auth_user$')
+
+
+class LargeTableAdminTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        cls.authors = [User.objects.create_user(username=f'author_{i}')
+                       for i in range(ROWS_AMOUNT)]
+        cls.groups = [Group.objects.create(title=f'Группа {i}',
+                                           slug=f'group-{i}',
+                                           description='Описание')
+                      for i in range(ROWS_AMOUNT)]
+        cls.posts = [Post.objects.create(text=f'Пост {i}', author=author,
+                                         group=group)
+                     for i, (author, group)
+                     in enumerate(zip(cls.authors, cls.groups))]
+        for post, author in zip(cls.posts, reversed(cls.authors)):
+            Comment.objects.create(post=post, author=author, text='Ок')
+            if author != post.author:
+                Follow.objects.create(user=author, author=post.author)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, params=None):
+        url = reverse(f'admin:posts_{model._meta.model_name}_changelist')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params or {})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return response, queries
+
+    def test_changelists_do_not_query_per_row(self):
+        for model in (Post, Comment, Follow, Group):
+            with self.subTest(model=model.__name__):
+                _, queries = self.changelist(model)
+                selects = [query['sql'] for query in queries
+                           if query['sql'].startswith('SELECT')]
+                self.assertLess(len(selects), 10, '\n'.join(selects))
+
+    def test_changelist_has_no_full_table_counts(self):
+        _, queries = self.changelist(Post)
+        counts = [query['sql'] for query in queries
+                  if 'COUNT(' in query['sql']]
+        self.assertEqual(counts, [])
+
+    def test_changelist_estimates_count(self):
+        response, _ = self.changelist(Post)
+        self.assertGreaterEqual(response.context['cl'].result_count,
+                                ROWS_AMOUNT)
+
+    def test_input_filters(self):
+        post = self.posts[3]
+        cases = (
+            (Post, {'author': post.author.username}, [post]),
+            (Post, {'group': post.group.slug}, [post]),
+            (Comment, {'post': str(post.pk)}, list(post.comments.all())),
+            (Comment, {'post': 'abc'}, []),
+            (Follow, {'author': post.author.username},
+             list(Follow.objects.filter(author=post.author))),
+        )
+        for model, params, expected in cases:
+            with self.subTest(model=model.__name__, params=params):
+                response, _ = self.changelist(model, params)
+                self.assertEqual(list(response.context['cl'].result_list),
+                                 expected)
+
+    def test_user_autocomplete_uses_prefix(self):
+        response = self.client.get(reverse('admin:auth_user_autocomplete'),
+                                   {'term': 'author_1'})
+        found = {item['text'] for item in response.json()['results']}
+        self.assertEqual(found, {'author_1', *(
+            f'author_{i}' for i in range(10, ROWS_AMOUNT))})
+
+    def test_user_search_keeps_user_admin_fields(self):
+        """Пользователь находится по началу email, имени и фамилии, в том
+        числе набранному строчными, и запрос идёт по индексам."""
+        user = User.objects.create_user(
+            username='ip', email='ivan@example.com', first_name='Иван',
+            last_name='Петров')
+        url = reverse('admin:auth_user_changelist')
+        for term in ('ivan@', 'иван', 'Петр', 'IP'):
+            with self.subTest(term=term):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, {'q': term})
+                self.assertEqual(list(response.context['cl'].result_list),
+                                 [user])
+                searches = [query['sql'] for query in queries
+                            if '"auth_user"."email" >=' in query['sql']]
+                self.assertTrue(searches)
+                with connection.cursor() as cursor:
+                    for sql in searches:
+                        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                        for row in cursor.fetchall():
+                            self.assertIsNone(
+                                FULL_SCAN.match(row[-1]), sql)
+
+    def test_group_search_uses_title_prefix(self):
+        response, _ = self.changelist(Group, {'q': 'Группа 1'})
+        self.assertEqual(len(response.context['cl'].result_list),
+                         1 + ROWS_AMOUNT - 10)
@@ -0,0 +1,71 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import (Comment, Follow, Group, Post, PostSearchIndex,
+                          TimelineEntry, User)
+from posts.search import match_query
+
+
+class BulkLoadTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(author=self.author, group=group,
+                                        text='Старые рукописи')
+        self.pub_date = (timezone.now() - timedelta(days=30)).replace(
+            microsecond=0)
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.pub_date)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def dump(self, name='dump.ndjson.gz'):
+        path = os.path.join(self.directory.name, name)
+        call_command('export_ndjson', path, stderr=StringIO())
+        for model in (Follow, Comment, Post, User, Group):
+            model.objects.all().delete()
+        return path
+
+    def load(self, path, *args):
+        out = StringIO()
+        call_command('bulk_load', path, *args, stdout=out, stderr=StringIO())
+        return out.getvalue()
+
+    def test_restores_dump_and_derived_data(self):
+        self.load(self.dump(), '--batch-size', '1')
+        post = Post.objects.select_related('author__stats').get()
+        self.assertEqual(post.pk, self.post.pk)
+        self.assertEqual(post.pub_date, self.pub_date)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.author.stats.posts_count, 1)
+        self.assertEqual(post.author.stats.followers_count, 1)
+        self.assertTrue(PostSearchIndex.objects.filter(
+            stems__match=match_query('рукописи')).exists())
+        self.assertTrue(TimelineEntry.objects.filter(
+            user__username='reader', post=post).exists())
+        self.assertGreater(
+            Post.objects.create(author=post.author, text='Новый').pk, post.pk)
+
+    def test_json_array_skips_other_models(self):
+        with open(self.dump('dump.ndjson'), encoding='utf-8') as dump:
+            records = [json.loads(line) for line in dump]
+        records.insert(0, {'model': 'sessions.session', 'pk': 'key',
+                           'fields': {}})
+        path = os.path.join(self.directory.name, 'dump.json')
+        with open(path, 'w', encoding='utf-8') as array:
+            json.dump(records, array, ensure_ascii=False, indent=2)
+        summary = self.load(path)
+        self.assertIn('пропущено записей других моделей: 1', summary)
+        self.assertEqual(Post.objects.get().text, 'Старые рукописи')
+        self.assertEqual(Follow.objects.count(), 1)
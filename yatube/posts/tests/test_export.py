@@ -0,0 +1,69 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post, User
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(title='Группа', slug='group',
+                                         description='Описание')
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.posts = [Post.objects.create(author=cls.author, group=cls.group,
+                                         text=f'Пост {i}')
+                     for i in range(5)]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def export(self, *args):
+        out, err = StringIO(), StringIO()
+        call_command('export_ndjson', *args, stdout=out, stderr=err)
+        return [json.loads(line) for line in out.getvalue().splitlines()], \
+            err.getvalue()
+
+    def test_exports_every_model_in_load_order(self):
+        objects, log = self.export('--chunk-size', '2')
+        models = [obj['model'] for obj in objects]
+        self.assertEqual(models, ['posts.group', 'auth.user', 'auth.user',
+                                  *['posts.post'] * 5, 'posts.comment',
+                                  'posts.follow'])
+        post = objects[3]
+        self.assertEqual(post['pk'], self.posts[0].pk)
+        self.assertEqual(post['fields']['author'], self.author.pk)
+        self.assertEqual(post['fields']['text'], 'Пост 0')
+        self.assertNotIn('groups', objects[1]['fields'])
+        self.assertIn(f'posts.post={self.posts[-1].pk}', log)
+
+    def test_incremental_export(self):
+        objects, _ = self.export(
+            '--since-id', f'posts.post={self.posts[2].pk}',
+            '--since-id', 'posts.group=1000',
+            '--since-date',
+            (timezone.now() + timedelta(days=1)).date().isoformat())
+        self.assertEqual([obj['pk'] for obj in objects
+                          if obj['model'] == 'posts.post'], [])
+        objects, _ = self.export(
+            '--since-id', f'posts.post={self.posts[2].pk}')
+        self.assertEqual([obj['pk'] for obj in objects
+                          if obj['model'] == 'posts.post'],
+                         [post.pk for post in self.posts[3:]])
+
+    def test_gzip_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'dump.ndjson.gz')
+            call_command('export_ndjson', path, stderr=StringIO())
+            with gzip.open(path, 'rt', encoding='utf-8') as dump:
+                lines = dump.read().splitlines()
+        self.assertEqual(len(lines), 10)
@@ -2,8 +2,10 @@ from http import HTTPStatus
 from django.core.cache import cache
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
 
 from posts.models import Post, User, Group, Comment
 from django.test import Client, TestCase, override_settings
@@ -115,13 +117,93 @@ class PostFormTests(TestCase):
             data=self.comment)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
 
-    def test_post_is_in_cache_after_deleting(self):
-        """При удалении поста из БД, она остается в response.content
-        до принудительной очистки кэша."""
-        response1 = self.auth_user.get(reverse('posts:index'))
-        Post.objects.get(pk=1).delete()
-        response2 = self.auth_user.get(reverse('posts:index'))
-        self.assertEqual(response1.content, response2.content)
+    def test_feed_cache_is_invalidated_after_writes(self):
+        """Лента берётся из кэша, пока нет записей, и обновляется сразу
+        после правки, комментария или удаления поста."""
+        url = reverse('posts:index')
         cache.clear()
-        response3 = self.auth_user.get(reverse('posts:index'))
-        self.assertNotEqual(response1.content, response3.content)
+        self.auth_user.get(url)
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо сигналов')
+        self.assertNotContains(self.auth_user.get(url), 'Мимо сигналов')
+
+        self.auth_user.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.id}),
+            data={'text': 'Отредактированный текст', 'group': self.group.id})
+        response = self.auth_user.get(url)
+        self.assertContains(response, 'Отредактированный текст')
+
+        self.auth_user.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.id}),
+            data=self.comment)
+        self.assertContains(self.auth_user.get(url), 'Комментариев: 1')
+
+        Post.objects.get(pk=self.post.pk).delete()
+        self.assertNotContains(self.auth_user.get(url),
+                               'Отредактированный текст')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadNormalizationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def photo(self, size=(3000, 1000), orientation=6):
+        """JPEG «с телефона»: повернут тегом EXIF Orientation."""
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        content = BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(
+            content, 'JPEG', exif=exif.tobytes())
+        return SimpleUploadedFile('photo.jpg', content.getvalue(),
+                                  content_type='image/jpeg')
+
+    def create_post(self, image):
+        return self.client.post(reverse('posts:post_create'),
+                                {'text': 'Фото', 'image': image})
+
+    def test_photo_is_rotated_downscaled_and_stripped(self):
+        self.create_post(self.photo())
+        with Image.open(Post.objects.get().image.path) as stored:
+            self.assertEqual(stored.size, (683, 2048))
+            self.assertNotIn('exif', stored.info)
+
+    def test_small_photo_loses_xmp(self):
+        """Небольшая картинка тоже пересохраняется: XMP (а в нём бывают
+        координаты) в сегменте APP1 не доходит до хранилища."""
+        xmp = (b'http://ns.adobe.com/xap/1.0/\x00'
+               b'<x:xmpmeta><exif:GPSLatitude>55,45N</exif:GPSLatitude>'
+               b'</x:xmpmeta>')
+        content = BytesIO()
+        Image.new('RGB', (100, 100)).save(content, 'JPEG')
+        data = content.getvalue()
+        data = (data[:2] + b'\xff\xe1' + (len(xmp) + 2).to_bytes(2, 'big')
+                + xmp + data[2:])
+        self.create_post(SimpleUploadedFile('small.jpg', data,
+                                            content_type='image/jpeg'))
+        with open(Post.objects.get().image.path, 'rb') as stored:
+            self.assertNotIn(b'GPSLatitude', stored.read())
+
+    @override_settings(UPLOAD_MAX_SIZE=1024)
+    def test_large_file_is_rejected(self):
+        response = self.create_post(self.photo())
+        self.assertFormError(response, 'form', 'image',
+                             'Файл больше 1,0\xa0КБ.')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(UPLOAD_MAX_PIXELS=1000)
+    def test_too_many_pixels_are_rejected(self):
+        response = self.create_post(self.photo(size=(100, 100)))
+        self.assertFormError(response, 'form', 'image',
+                             'Картинка 100×100 слишком велика: больше '
+                             '1 000 пикселей.')
+        self.assertFalse(Post.objects.exists())
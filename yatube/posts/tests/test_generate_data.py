@@ -0,0 +1,87 @@
+import shutil
+import tempfile
+from datetime import date
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F, Sum
+from django.test import TestCase, override_settings
+
+from posts.models import (Comment, Follow, Group, Post, PostSearchIndex,
+                          TimelineEntry, User, UserStats)
+from posts.synthetic import SyntheticData
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDataTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, *args):
+        call_command('generate_data', '--users', '40', '--groups', '10',
+                     '--posts', '600', '--comments', '300', '--follows',
+                     '200', '--until', '2026-01-01', *args,
+                     stdout=StringIO(), stderr=StringIO())
+
+    def test_creates_skewed_dataset_with_derived_data(self):
+        self.generate('--images', '0.5')
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(Group.objects.count(), 10)
+        self.assertEqual(Post.objects.count(), 600)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        self.assertGreater(Post.objects.exclude(image='').count(), 200)
+        self.assertEqual(
+            Post.objects.latest('pub_date').pub_date.date(), date(2026, 1, 1))
+        posts_per_author = sorted(
+            Post.objects.order_by().values('author')
+            .annotate(posts=Count('pk'))
+            .values_list('posts', flat=True), reverse=True)
+        # Средний автор пишет 15 постов, самый плодовитый — в разы больше.
+        self.assertGreater(posts_per_author[0], 4 * 600 / 40)
+        stats = UserStats.objects.aggregate(
+            posts=Sum('posts_count'), followers=Sum('followers_count'))
+        self.assertEqual(stats['posts'], 600)
+        self.assertEqual(stats['followers'], Follow.objects.count())
+        self.assertEqual(
+            Post.objects.aggregate(comments=Sum('comments_count'))['comments'],
+            300)
+        self.assertEqual(PostSearchIndex.objects.count(), 600)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+    def test_indexes_are_rebuilt_after_load(self):
+        """Индексы, снятые на время записи, после загрузки на месте."""
+        def indexes():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name, sql FROM sqlite_master "
+                               "WHERE type = 'index' ORDER BY name")
+                return cursor.fetchall()
+
+        before = indexes()
+        self.generate()
+        self.assertEqual(indexes(), before)
+
+    def test_seed_makes_data_reproducible(self):
+        def rows(seed):
+            data = SyntheticData(seed, users=5, groups=2, posts=20,
+                                 comments=10, follows=5,
+                                 until=date(2026, 1, 1))
+            return [list(data.posts()),
+                    [username for _, username, *_ in data.users()]]
+
+        self.assertEqual(rows(1), rows(1))
+        self.assertNotEqual(rows(1), rows(2))
+
+    def test_appends_after_existing_rows(self):
+        self.generate()
+        self.generate('--seed', '1')
+        self.assertEqual(Post.objects.count(), 1200)
+        self.assertEqual(User.objects.count(), 80)
+        post = Post.objects.create(author=User.objects.first(), text='Новый')
+        self.assertEqual(post.pk, Post.objects.order_by('pk').last().pk)
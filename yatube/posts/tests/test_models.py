@@ -1,7 +1,10 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.conf import settings
 
-from posts.models import Group, Post, User
+from posts.models import Comment, Follow, Group, Post, User, UserStats
 
 
 class PostModelTest(TestCase):
@@ -38,3 +41,74 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     self.post._meta.get_field(field).verbose_name,
                     expected_value)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(user=user, field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении постов,
+        комментариев и подписок."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Ещё пост')
+        comment = Comment.objects.create(post=post, author=self.reader,
+                                         text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertStats(self.author, posts_count=2, followers_count=1)
+        self.assertStats(self.reader, posts_count=0, following_count=1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        self.assertStats(self.author, posts_count=1, followers_count=0)
+        self.assertStats(self.reader, following_count=0)
+
+    def test_edit_keeps_comments_added_meanwhile(self):
+        """Сохранение поста, прочитанного до нового комментария, не
+        возвращает счётчику старое значение."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Comment.objects.create(post=post, author=self.reader,
+                               text='Комментарий')
+        post.text = 'Исправленный пост'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(post.text, 'Исправленный пост')
+
+    def test_explicit_update_fields_are_kept(self):
+        """Явный update_fields пишется как передан, с comments_count."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        post.comments_count = 5
+        post.text = 'Не сохраняется'
+        post.save(update_fields=['comments_count'])
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 5)
+        self.assertEqual(post.text, 'Пост')
+
+    def test_reconcile_counters_fixes_drift(self):
+        """reconcile_counters пересчитывает счётчики, разошедшиеся
+        после массовых вставок."""
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Пост {i}') for i in range(3))
+        post = Post.objects.first()
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.reader, text='Комментарий')
+            for _ in range(2))
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('reconcile_counters', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 2)
+        self.assertStats(self.author, posts_count=3)
+        self.assertStats(self.reader, posts_count=0)
@@ -0,0 +1,78 @@
+import re
+
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+
+POSTS_PER_AUTHOR = 100
+AUTHORS_AMOUNT = 20
+FOLLOWS_PER_USER = 5
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?posts_\w+$')
+
+
+class FeedQueryPlanTests(TestCase):
+    """EXPLAIN QUERY PLAN для запросов каждой страницы с лентой:
+    без полного просмотра таблиц posts_* и без сортировки во временном
+    B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.groups = [
+            Group.objects.create(title=f'Группа {i}', slug=f'group-{i}',
+                                 description='Описание')
+            for i in range(AUTHORS_AMOUNT // 2)]
+        cls.authors = [
+            User.objects.create_user(username=f'author_{i}')
+            for i in range(AUTHORS_AMOUNT)]
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author,
+                 group=cls.groups[i % len(cls.groups)])
+            for author in cls.authors
+            for i in range(POSTS_PER_AUTHOR))
+        cls.post = Post.objects.filter(author=cls.authors[0]).first()
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text='Комментарий')
+            for author in cls.authors)
+        for i, user in enumerate(cls.authors):
+            for author in cls.authors[i + 1:i + 1 + FOLLOWS_PER_USER]:
+                Follow.objects.create(user=user, author=author)
+        cls.reader = cls.authors[0]
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def query_plans(self, url, params=None):
+        with CaptureQueriesContext(connection) as context:
+            response = self.reader_client.get(url, params)
+        page_obj = response.context.get('page_obj')
+        if params is None and page_obj and page_obj.next_cursor:
+            yield from self.query_plans(
+                url, {'cursor': page_obj.next_cursor})
+        with connection.cursor() as cursor:
+            for query in context.captured_queries:
+                sql = query['sql']
+                if not sql.startswith('SELECT') or 'posts_' not in sql:
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                yield sql, [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы страниц приложения posts идут по индексам."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(self.groups[0].slug,)),
+            reverse('posts:profile', args=(self.authors[0].username,)),
+            reverse('posts:post_detail', args=(self.post.id,)),
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            for sql, plan in self.query_plans(url):
+                with self.subTest(url=url, sql=sql):
+                    for step in plan:
+                        self.assertNotIn('TEMP B-TREE', step)
+                        self.assertIsNone(FULL_SCAN.match(step))
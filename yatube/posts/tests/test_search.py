@@ -0,0 +1,102 @@
+from http import HTTPStatus
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post, PostSearchIndex, User
+from posts.search import highlight, match_query, stem
+
+
+class StemmerTests(TestCase):
+    def test_word_forms_share_stem(self):
+        for forms in (('книга', 'книги', 'книгой', 'книгами'),
+                      ('красивый', 'красивая', 'красивыми'),
+                      ('тестирование', 'тестирования', 'тестированием')):
+            with self.subTest(forms=forms):
+                self.assertEqual(len({stem(word) for word in forms}), 1)
+
+    def test_match_query_quotes_terms(self):
+        self.assertEqual(match_query('Книги OR "котов"*'),
+                         '"книг" "or" "кот"')
+        self.assertIsNone(match_query(' !? '))
+
+    def test_highlight_escapes_text(self):
+        self.assertEqual(
+            highlight('<b>Про</b> книги', 'книга'),
+            '&lt;b&gt;Про&lt;/b&gt; <mark>книги</mark>')
+
+
+class PostSearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='reader')
+        cls.relevant = Post.objects.create(
+            author=cls.author, text='Книги, книги и снова книги о котах')
+        cls.other = Post.objects.create(
+            author=cls.author, text='Одна книга и много собак')
+        cls.unrelated = Post.objects.create(
+            author=cls.author, text='Совсем про другое')
+
+    def setUp(self):
+        self.client = Client()
+
+    def search_ids(self, query):
+        return list(PostSearchIndex.objects.search(match_query(query))
+                    .values_list('post_id', flat=True))
+
+    def test_index_follows_post_changes(self):
+        post = Post.objects.create(author=self.author, text='Про ежей')
+        self.assertEqual(self.search_ids('ёж'), [post.pk])
+        post.text = 'Теперь про ужей'
+        post.save()
+        self.assertEqual(self.search_ids('ежи'), [])
+        self.assertEqual(self.search_ids('ужи'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search_ids('ужи'), [])
+
+    def test_results_are_ranked_and_highlighted(self):
+        response = self.client.get(reverse('posts:search'), {'q': 'книгу'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        posts = list(response.context['page_obj'])
+        self.assertEqual(posts, [self.relevant, self.other])
+        self.assertIn('<mark>книга</mark>', posts[1].snippet)
+
+    def test_empty_query_shows_form_only(self):
+        response = self.client.get(reverse('posts:search'), {'q': '  '})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertIsNone(response.context['page_obj'])
+
+    def test_results_are_cursor_paginated(self):
+        Post.objects.bulk_create(
+            Post(author=self.author, text=f'Заметка номер {i}')
+            for i in range(settings.POSTS_AMOUNT + 3))
+        call_command('rebuild_search_index', stdout=StringIO())
+        url = reverse('posts:search')
+        first = self.client.get(url, {'q': 'заметки'}).context['page_obj']
+        self.assertEqual(len(first), settings.POSTS_AMOUNT)
+        second = self.client.get(
+            url, {'q': 'заметки', 'cursor': first.next_cursor}
+        ).context['page_obj']
+        self.assertEqual(len(second), 3)
+        self.assertFalse({post.pk for post in first}
+                         & {post.pk for post in second})
+        back = self.client.get(
+            url, {'q': 'заметки', 'cursor': second.previous_cursor}
+        ).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        last = self.client.get(
+            url, {'q': 'заметки', 'page': 'last'}).context['page_obj']
+        self.assertEqual(list(last), list(second))
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(admin)
+        response = self.client.get(reverse('admin:posts_post_changelist'),
+                                   {'q': 'котов'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.relevant])
@@ -0,0 +1,138 @@
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from PIL import Image
+from sorl.thumbnail import default
+
+from core.models import Job
+from posts.models import Post, User
+from posts.thumbnails import (POST_THUMBNAIL_FORMATS, post_image_sources,
+                              post_thumbnails, stored_post_image_sources)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+# Картинка шириной 1000: вариант 1920 не режется.
+WIDTHS = [320, 640, 960]
+
+
+def image_file(name, size):
+    content = BytesIO()
+    Image.new('RGB', size).save(content, 'PNG')
+    return SimpleUploadedFile(name, content.getvalue(),
+                              content_type='image/png')
+
+
+def media_files():
+    return {os.path.join(path, name)
+            for path, _, names in os.walk(TEMP_MEDIA_ROOT) for name in names}
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='painter')
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.author,
+            image=image_file('photo.png', (1000, 400)))
+        Post.objects.create(text='Пост без картинки', author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def assert_variants_stored(self, thumbnails):
+        self.assertEqual(set(thumbnails), set(POST_THUMBNAIL_FORMATS))
+        for variants in thumbnails.values():
+            self.assertEqual([width for width, _ in variants], WIDTHS)
+            for width, thumbnail in variants:
+                self.assertTrue(os.path.exists(
+                    os.path.join(TEMP_MEDIA_ROOT, thumbnail.name)))
+                self.assertEqual(thumbnail.width, width)
+                self.assertEqual(default.kvstore.get(thumbnail).name,
+                                 thumbnail.name)
+
+    def test_all_variants_are_stored(self):
+        self.assert_variants_stored(post_thumbnails(self.post.image.name))
+
+    def test_backfill_command(self):
+        out = StringIO()
+        call_command('generate_thumbnails', processes=0, stdout=out)
+        self.assertIn('Миниатюр готово: 1, ошибок: 0.', out.getvalue())
+        self.assert_variants_stored(post_thumbnails(self.post.image.name))
+
+    def test_post_image_tag_renders_srcset(self):
+        html = Template(
+            '{% load post_images %}{% post_image post.image %}'
+        ).render(Context({'post': self.post}))
+        self.assertIn('<picture>', html)
+        self.assertEqual(html.count('<source '), len(POST_THUMBNAIL_FORMATS))
+        for width in WIDTHS:
+            self.assertIn(f' {width}w', html)
+        self.assertNotIn(' 1920w', html)
+
+    def test_small_image_is_not_upscaled(self):
+        """Картинка уже самой узкой миниатюры даёт один вариант
+        в свою ширину."""
+        post = Post.objects.create(text='Маленькая', author=self.author,
+                                   image=image_file('tiny.png', (200, 100)))
+        for variants in post_thumbnails(post.image.name).values():
+            self.assertEqual([(width, thumbnail.width)
+                              for width, thumbnail in variants],
+                             [(200, 200)])
+
+    def test_sources_are_cached_in_one_key(self):
+        """Повторная карточка не обращается ни к хранилищу ключей sorl,
+        ни к файлу картинки."""
+        sources = post_image_sources(self.post.image.name)
+        with self.assertNumQueries(0):
+            self.assertEqual(post_image_sources(self.post.image.name),
+                             sources)
+
+    @override_settings(JOBS_EAGER=False)
+    def test_post_image_tag_does_not_cut_thumbnails(self):
+        """Без готовых миниатюр шаблон выводит оригинал и ставит нарезку
+        в очередь, а сам картинку не обрабатывает."""
+        post = Post.objects.create(text='Свежая', author=self.author,
+                                   image=image_file('fresh.png', (1000, 400)))
+        template = Template(
+            '{% load post_images %}{% post_image post.image %}')
+        files = media_files()
+        html = template.render(Context({'post': post}))
+        self.assertIn(f'src="{post.image.url}"', html)
+        self.assertNotIn('<source ', html)
+        self.assertEqual(media_files(), files)
+        self.assertTrue(Job.objects.filter(
+            dedup_key=f'post_thumbnails:{post.image.name}').exists())
+
+        call_command('runworker', '--once', stdout=StringIO())
+        html = template.render(Context({'post': post}))
+        self.assertEqual(html.count('<source '), len(POST_THUMBNAIL_FORMATS))
+
+    def test_stored_sources_match_generated(self):
+        """Без кэша карточка собирает те же варианты из хранилища ключей
+        sorl, ничего не нарезая."""
+        sources = post_image_sources(self.post.image.name)
+        cache.clear()
+        with override_settings(JOBS_EAGER=False):
+            self.assertEqual(
+                stored_post_image_sources(self.post.image.name), sources)
+
+    def test_post_image_tag_without_image(self):
+        html = Template(
+            '{% load post_images %}{% post_image post.image %}'
+        ).render(Context({'post': Post(text='Без картинки')}))
+        self.assertEqual(html.strip(), '')
@@ -1,17 +1,40 @@
+import gzip
 import shutil
 import tempfile
+from contextlib import contextmanager
+from http import HTTPStatus
+from io import StringIO
 
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from django.conf import settings
 from django import forms
 
-from posts.models import Post, User, Group
+from posts.caching import (FEED_FOLLOWER, FEED_GROUP, feed_count,
+                           feed_name, feed_version, followed_authors)
+from posts.models import Comment, Follow, Post, User, UserStats, Group
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@contextmanager
+def committed():
+    """Выполняет на выходе функции on_commit, отложенные внутри блока, как
+    при настоящем коммите: TestCase держит весь тест в транзакции."""
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostViewsTests(TestCase):
     @classmethod
@@ -131,6 +154,9 @@ class PaginatorViewsTest(TestCase):
             reverse('posts:profile', kwargs={'username': cls.author.username}),
         )
 
+    def setUp(self):
+        cache.clear()
+
     def test_paginator_on_pages(self):
         """Проверка пагинации на страницах."""
         LAST_PAGE_POSTS_AMOUNT = 3
@@ -143,3 +169,444 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(len(self.guest.get(
                     url + '?page=2').context.get('page_obj')),
                     LAST_PAGE_POSTS_AMOUNT)
+
+    def test_cursor_paginator_on_pages(self):
+        """Курсоры ведут по ленте вперёд и назад без пропусков."""
+        for url in self.url_pages:
+            with self.subTest(url=url):
+                first_page = self.guest.get(url).context['page_obj']
+                self.assertIsNone(first_page.previous_cursor)
+                second_page = self.guest.get(
+                    url, {'cursor': first_page.next_cursor}
+                ).context['page_obj']
+                self.assertEqual(second_page.number, 2)
+                self.assertIsNone(second_page.next_cursor)
+                self.assertEqual(
+                    len(first_page) + len(second_page),
+                    Post.objects.count())
+                self.assertFalse(
+                    set(first_page.object_list)
+                    & set(second_page.object_list))
+                back_page = self.guest.get(
+                    url, {'cursor': second_page.previous_cursor}
+                ).context['page_obj']
+                self.assertEqual(back_page.object_list,
+                                 first_page.object_list)
+
+    def test_last_page(self):
+        """?page=last отдаёт хвост ленты с правильным номером."""
+        for url in self.url_pages:
+            with self.subTest(url=url):
+                page_obj = self.guest.get(
+                    url, {'page': 'last'}).context['page_obj']
+                self.assertEqual(page_obj.number, 2)
+                self.assertEqual(len(page_obj), 3)
+                self.assertIsNone(page_obj.next_cursor)
+
+    @override_settings(POSTS_AMOUNT=1)
+    def test_page_links_are_elided(self):
+        """Ссылки на страницы: первая, последняя и окно вокруг текущей."""
+        page_obj = self.guest.get(
+            self.url_pages[0], {'page': 7}).context['page_obj']
+        self.assertEqual([number for number, _ in page_obj.page_links],
+                         [1, None, 5, 6, 7, 8, 9, None, 13])
+
+    @override_settings(POSTS_AMOUNT=1)
+    def test_first_and_last_links_are_not_repeated(self):
+        """Первая и последняя страницы уже есть в окне ссылок, отдельных
+        ссылок на них нет."""
+        response = self.guest.get(self.url_pages[0], {'page': 7})
+        self.assertContains(response, 'page=last"', count=1)
+        self.assertContains(response, 'page=1"', count=1)
+
+    def test_feed_count_is_cached_and_invalidated(self):
+        """Размер ленты берётся из кэша и сбрасывается новым постом."""
+        self.guest.get(self.url_pages[1])
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                feed_count(feed_name(FEED_GROUP, self.group.pk),
+                           self.group.posts), 13)
+        Post.objects.create(text='Новый', author=self.author,
+                            group=self.group)
+        self.assertEqual(
+            feed_count(feed_name(FEED_GROUP, self.group.pk),
+                       self.group.posts), 14)
+
+    def test_paginator_ignores_broken_cursor_and_huge_page(self):
+        """Битый курсор и огромный номер страницы отдают первую
+        страницу."""
+        for params in ({'cursor': 'broken'},
+                       {'page': settings.PAGINATION_MAX_PAGE + 1}):
+            with self.subTest(params=params):
+                page_obj = self.guest.get(
+                    self.url_pages[0], params).context['page_obj']
+                self.assertEqual(page_obj.number, 1)
+                self.assertEqual(len(page_obj), settings.POSTS_AMOUNT)
+
+
+class FollowTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Writer')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.old_post = Post.objects.create(text='До подписки',
+                                           author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_feed(self):
+        return list(self.reader_client.get(
+            reverse('posts:follow_index')).context['page_obj'])
+
+    def test_timeline_follows_subscriptions(self):
+        """Лента подписок пополняется при подписке и новом посте
+        и очищается при отписке и удалении поста."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow', args=(self.author.username,)))
+        self.assertEqual(self.get_feed(), [self.old_post])
+
+        new_post = Post.objects.create(text='После подписки',
+                                       author=self.author)
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+        new_post.delete()
+        self.assertEqual(self.get_feed(), [self.old_post])
+
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow', args=(self.author.username,)))
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(JOBS_EAGER=False)
+    def test_new_post_reaches_followers_through_job_queue(self):
+        """Пост попадает в ленты подписчиков, когда выполнится задача."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertEqual(self.get_feed(), [self.old_post])
+        new_post = Post.objects.create(text='Из очереди', author=self.author)
+        self.assertEqual(self.get_feed(), [self.old_post])
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertEqual(self.get_feed(), [new_post, self.old_post])
+
+    @override_settings(JOBS_EAGER=False)
+    def test_follow_fills_timeline_through_job_queue(self):
+        """Ленту при подписке заполняет задача, и она не вернёт посты,
+        если до неё дошла уже отписка."""
+        follow = reverse('posts:profile_follow', args=(self.author.username,))
+        unfollow = reverse('posts:profile_unfollow',
+                           args=(self.author.username,))
+        self.reader_client.post(follow)
+        self.assertEqual(self.get_feed(), [])
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertEqual(self.get_feed(), [self.old_post])
+
+        self.reader_client.post(unfollow)
+        self.reader_client.post(follow)
+        self.reader_client.post(unfollow)
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertEqual(self.get_feed(), [])
+
+    @override_settings(JOBS_EAGER=False)
+    def test_comment_resets_follower_feeds_through_job_queue(self):
+        """Комментарий не читает подписчиков автора в запросе: кэш их
+        лент сбрасывает задача."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        feed = feed_name(FEED_FOLLOWER, self.reader.pk)
+        version = feed_version(feed)
+        with CaptureQueriesContext(connection) as queries:
+            Comment.objects.create(post=self.old_post, author=self.reader,
+                                   text='Комментарий')
+        self.assertFalse([query for query in queries.captured_queries
+                          if Follow._meta.db_table in query['sql']])
+        self.assertEqual(feed_version(feed), version)
+        call_command('runworker', '--once', stdout=StringIO())
+        self.assertNotEqual(feed_version(feed), version)
+
+    def test_followed_authors_are_cached_until_follow_changes(self):
+        """Множество подписок читается из кэша и сбрасывается при
+        подписке и отписке."""
+        cache.clear()
+        self.assertEqual(followed_authors(self.reader), frozenset())
+        with self.assertNumQueries(0):
+            followed_authors(self.reader)
+        profile = reverse('posts:profile', args=(self.author.username,))
+        self.assertFalse(self.reader_client.get(profile).context['following'])
+
+        with committed():
+            self.reader_client.get(reverse(
+                'posts:profile_follow', args=(self.author.username,)))
+            # До коммита кэш не сбрасывается.
+            self.assertEqual(followed_authors(self.reader), frozenset())
+        self.assertEqual(followed_authors(self.reader), {self.author.pk})
+        self.assertTrue(self.reader_client.get(profile).context['following'])
+        self.assertTrue(self.reader_client.get(
+            reverse('posts:search'), {'q': 'подписки'}
+        ).context['page_obj'][0].author_followed)
+
+        with committed():
+            self.reader_client.get(reverse(
+                'posts:profile_unfollow', args=(self.author.username,)))
+        self.assertEqual(followed_authors(self.reader), frozenset())
+
+    def test_post_returns_follow_state(self):
+        """POST подписки и отписки отвечает JSON с новым состоянием;
+        повторы ничего не меняют, на себя подписаться нельзя."""
+        follow = reverse('posts:profile_follow', args=(self.author.username,))
+        unfollow = reverse('posts:profile_unfollow',
+                           args=(self.author.username,))
+        for _ in range(2):
+            self.assertEqual(self.reader_client.post(follow).json(),
+                             {'following': True, 'followers_count': 1})
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+        stats = UserStats.objects.get(user=self.reader)
+        self.assertEqual(stats.following_count, 1)
+        for _ in range(2):
+            self.assertEqual(self.reader_client.post(unfollow).json(),
+                             {'following': False, 'followers_count': 0})
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+        stats.refresh_from_db()
+        self.assertEqual(stats.following_count, 0)
+
+        own = reverse('posts:profile_follow', args=(self.reader.username,))
+        self.assertFalse(self.reader_client.post(own).json()['following'])
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_follow_is_single_statement(self):
+        """Подписка и отписка — один запрос к posts_follow, без
+        предварительной проверки."""
+        for view in ('posts:profile_follow', 'posts:profile_unfollow'):
+            with self.subTest(view=view), \
+                    CaptureQueriesContext(connection) as queries:
+                self.reader_client.get(
+                    reverse(view, args=(self.author.username,)))
+            self.assertEqual(len([
+                query for query in queries
+                if Follow._meta.db_table in query['sql']
+                and 'timeline' not in query['sql']]), 1)
+
+
+class FeedResponseCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Cached')
+        cls.post = Post.objects.create(text='Кэшируемый пост',
+                                       author=cls.author)
+        cls.url = reverse('posts:profile', args=(cls.author.username,))
+
+    def setUp(self):
+        cache.clear()
+        self.guest = Client()
+
+    def test_anonymous_response_is_cached(self):
+        """Повторный анонимный запрос не выполняет view, а новый пост
+        сразу сбрасывает ответ."""
+        first = self.guest.get(self.url)
+        with self.assertNumQueries(1):
+            second = self.guest.get(self.url)
+        self.assertEqual(first.content, second.content)
+        Post.objects.create(text='Свежий пост', author=self.author)
+        self.assertContains(self.guest.get(self.url), 'Свежий пост')
+
+    def test_conditional_get(self):
+        """If-None-Match и If-Modified-Since дают 304, пока лента
+        не изменилась."""
+        response = self.guest.get(self.url)
+        for headers in (
+                {'HTTP_IF_NONE_MATCH': response['ETag']},
+                {'HTTP_IF_MODIFIED_SINCE': response['Last-Modified']}):
+            with self.subTest(headers=headers):
+                self.assertEqual(self.guest.get(self.url, **headers)
+                                 .status_code, HTTPStatus.NOT_MODIFIED)
+        self.post.text = 'Исправленный текст'
+        self.post.save()
+        self.assertEqual(
+            self.guest.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, HTTPStatus.OK)
+
+    def test_follow_resets_profile_counts(self):
+        """Счётчики подписок в шапке профиля входят в кэшированный
+        ответ, поэтому подписка и отписка его сбрасывают."""
+        reader = User.objects.create_user(username='Counting')
+        response = self.guest.get(self.url)
+        self.assertContains(response, 'followers-count">0<')
+        with committed():
+            follow = Follow.objects.create(user=reader, author=self.author)
+        self.assertEqual(
+            self.guest.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+            .status_code, HTTPStatus.OK)
+        self.assertContains(self.guest.get(self.url), 'followers-count">1<')
+        with committed():
+            follow.delete()
+        self.assertContains(self.guest.get(self.url), 'followers-count">0<')
+
+    def test_gzip_body(self):
+        """Клиенту с gzip отдаётся заранее сжатое тело."""
+        plain = self.guest.get(self.url)
+        packed = self.guest.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(packed['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(packed.content), plain.content)
+
+    def test_gzip_refused_by_quality(self):
+        """gzip с q=0 — отказ, даже если * разрешает всё остальное."""
+        for header, packed in (('gzip;q=0', False), ('gzip; q=0.0, *', False),
+                               ('br, gzip;q=0.5', True), ('*', True),
+                               ('identity', False)):
+            with self.subTest(header=header):
+                response = self.guest.get(self.url,
+                                          HTTP_ACCEPT_ENCODING=header)
+                self.assertEqual(response.has_header('Content-Encoding'),
+                                 packed)
+
+    def test_user_rename_resets_feeds(self):
+        """Смена имени автора или комментатора меняет ETag лент, где оно
+        выводится; вход в систему — нет."""
+        commenter = User.objects.create_user(username='Commenter')
+        Comment.objects.create(post=self.post, author=commenter,
+                               text='Реплика')
+        urls = (self.url, reverse('posts:index'))
+        responses = [self.guest.get(url) for url in urls]
+        commenter.last_login = timezone.now()
+        commenter.save(update_fields=['last_login'])
+        for url, response in zip(urls, responses):
+            self.assertEqual(
+                self.guest.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                .status_code, HTTPStatus.NOT_MODIFIED)
+        # Комментатор выводится логином, автор в общей ленте — и именем.
+        commenter.username = 'Renamed'
+        commenter.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest.get(url), 'Renamed')
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        self.assertContains(self.guest.get(urls[1]), 'Новое имя')
+
+    def test_group_change_resets_feeds(self):
+        """Правка группы меняет ETag её страницы и лент с её постами."""
+        group = Group.objects.create(title='Старое название', slug='old',
+                                     description='Описание')
+        self.post.group = group
+        self.post.save()
+        urls = (reverse('posts:group_list', args=(group.slug,)),
+                reverse('posts:index'), self.url)
+        etags = [self.guest.get(url)['ETag'] for url in urls]
+        group.title = 'Новое название'
+        group.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.guest.get(url, HTTP_IF_NONE_MATCH=etag)
+                    .status_code, HTTPStatus.OK)
+        self.assertContains(self.guest.get(urls[0]), 'Новое название')
+
+
+@override_settings(COMMENTS_AMOUNT=3)
+class CommentPaginationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='Commentator')
+        cls.post = Post.objects.create(text='Обсуждаемый пост', author=author)
+        cls.comments = [Comment.objects.create(post=cls.post, author=author,
+                                               text=f'Комментарий {i}')
+                        for i in range(7)]
+        cls.post.refresh_from_db()
+        cls.url = reverse('posts:post_detail', args=(cls.post.pk,))
+        cls.fragment_url = reverse('posts:post_comments',
+                                   args=(cls.post.pk,))
+
+    def pages(self, order):
+        """Тексты комментариев по страницам: страница поста, затем
+        фрагменты по курсору next_cursor."""
+        response = self.client.get(self.url, {'order': order})
+        pages = []
+        while True:
+            page = response.context['comments']
+            pages.append([comment.text for comment in page])
+            if not page.next_cursor:
+                return pages
+            response = self.client.get(self.fragment_url, {
+                'order': order, 'cursor': page.next_cursor})
+            self.assertTemplateUsed(response, 'posts/includes/comments.html')
+            self.assertNotContains(response, '<html')
+
+    def test_comments_are_paginated_both_ways(self):
+        texts = [comment.text for comment in self.comments]
+        self.assertEqual(self.pages('oldest'),
+                         [texts[0:3], texts[3:6], texts[6:]])
+        self.assertEqual(self.pages('newest'),
+                         [texts[:3:-1], texts[3:0:-1], texts[:1]])
+
+    def test_comment_page_cost_is_bounded(self):
+        """Страница комментариев — один запрос вместе с авторами,
+        без COUNT: число берётся из post.comments_count."""
+        page = self.client.get(self.url).context['comments']
+        with self.assertNumQueries(2):
+            response = self.client.get(self.fragment_url,
+                                       {'cursor': page.next_cursor})
+        self.assertContains(response, 'Commentator', count=6)
+
+    def test_new_comment_is_shown_first(self):
+        self.client.force_login(User.objects.get(username='Commentator'))
+        response = self.client.post(
+            reverse('posts:add_comment', args=(self.post.pk,)),
+            {'text': 'Свежий комментарий'}, follow=True)
+        self.assertEqual(response.context['comments_order'], 'newest')
+        self.assertEqual(response.context['comments'][0].text,
+                         'Свежий комментарий')
+
+
+class LatestCommentsPreviewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Speaker')
+        cls.reader = User.objects.create_user(username='Listener')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.quiet, cls.single, cls.busy = [
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+            for i in range(3)]
+        Comment.objects.create(post=cls.single, author=cls.reader,
+                               text='Единственный')
+        for i in range(4):
+            Comment.objects.create(post=cls.busy, author=cls.reader,
+                                   text=f'Реплика {i}')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def comment_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        return response, [query for query in context.captured_queries
+                          if 'FROM "posts_comment"' in query['sql']]
+
+    def test_feeds_show_latest_comments_in_one_query(self):
+        for url in (reverse('posts:index'),
+                    reverse('posts:profile', args=(self.author.username,)),
+                    reverse('posts:follow_index')):
+            with self.subTest(url=url):
+                cache.clear()
+                response, queries = self.comment_queries(url)
+                self.assertEqual(len(queries), 1)
+                previews = {post.pk: [comment.text for comment
+                                      in post.latest_comments]
+                            for post in response.context['page_obj']}
+                self.assertEqual(previews, {
+                    self.quiet.pk: [],
+                    self.single.pk: ['Единственный'],
+                    self.busy.pk: ['Реплика 2', 'Реплика 3'],
+                })
+                self.assertContains(response, 'Реплика 3')
+                self.assertNotContains(response, 'Реплика 1')
+
+    def test_cached_fragment_skips_preview_query(self):
+        url = reverse('posts:index')
+        self.comment_queries(url)
+        _, queries = self.comment_queries(url)
+        self.assertEqual(queries, [])
@@ -0,0 +1,151 @@
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from PIL import Image, features
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.jobs import job
+
+# Пропорции карточки поста и ширины вариантов для srcset. Ширины больше
+# картинки не режутся: увеличенная копия тяжелее и не чётче. Самый
+# широкий JPEG не шире POST_THUMBNAIL_FALLBACK_WIDTH уходит в src для
+# браузеров без поддержки srcset.
+POST_THUMBNAIL_RATIO = (960, 339)
+POST_THUMBNAIL_WIDTHS = (320, 640, 960, 1920)
+POST_THUMBNAIL_FALLBACK_WIDTH = 960
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': False, 'quality': 85}
+POST_IMAGE_KEY = 'post_image:{}'
+# WebP режем, только если Pillow собран с libwebp.
+POST_THUMBNAIL_FORMATS = (
+    ('WEBP', 'JPEG') if features.check('webp') else ('JPEG',))
+# Миниатюры подождут: пока их нет, шаблон показывает оригинал.
+THUMBNAILS_JOB_PRIORITY = -10
+
+logger = logging.getLogger(__name__)
+
+
+def thumbnail_geometry(width):
+    ratio_width, ratio_height = POST_THUMBNAIL_RATIO
+    return f'{width}x{round(width * ratio_height / ratio_width)}'
+
+
+def largest_width(image_name):
+    """Наибольшая ширина миниатюры в пропорциях карточки, которую
+    картинка даёт без увеличения. Размеры читаются из заголовка."""
+    with default_storage.open(image_name) as file:
+        width, height = Image.open(file).size
+    ratio_width, ratio_height = POST_THUMBNAIL_RATIO
+    return max(min(width, height * ratio_width // ratio_height), 1)
+
+
+def thumbnail_widths(image_name):
+    largest = largest_width(image_name)
+    return [width for width in POST_THUMBNAIL_WIDTHS
+            if width <= largest] or [largest]
+
+
+def post_thumbnails(image_name):
+    """Все варианты миниатюры картинки поста: {формат: [(ширина,
+    миниатюра), ...]}. Недостающие sorl нарежет и запишет в хранилище
+    ключей, готовые достаёт оттуда же без работы с картинкой."""
+    widths = thumbnail_widths(image_name)
+    return {
+        image_format: [
+            (width, get_thumbnail(image_name, thumbnail_geometry(width),
+                                  format=image_format,
+                                  **POST_THUMBNAIL_OPTIONS))
+            for width in widths]
+        for image_format in POST_THUMBNAIL_FORMATS
+    }
+
+
+def srcset(variants):
+    return ', '.join(f'{thumbnail.url} {width}w'
+                     for width, thumbnail in variants)
+
+
+def image_sources(thumbnails):
+    jpeg = thumbnails['JPEG']
+    _, fallback = max(
+        (variant for variant in jpeg
+         if variant[0] <= POST_THUMBNAIL_FALLBACK_WIDTH),
+        default=jpeg[0], key=lambda variant: variant[0])
+    return {
+        'srcsets': [(image_format, srcset(variants))
+                    for image_format, variants in thumbnails.items()],
+        'src': fallback.url,
+    }
+
+
+def post_image_sources(image_name):
+    """srcset каждого формата и src для <img>: {'srcsets': [(формат,
+    srcset), ...], 'src': адрес}. Недостающие миниатюры нарезает, поэтому
+    вызывается только из задачи и команды generate_thumbnails. Результат
+    лежит в кэше одним ключом на картинку, чтобы карточка не ходила
+    в хранилище ключей sorl за каждым вариантом. Имя файла при замене
+    картинки меняется, поэтому ключ не устаревает."""
+    key = POST_IMAGE_KEY.format(image_name)
+    sources = cache.get(key)
+    if sources is None:
+        sources = image_sources(post_thumbnails(image_name))
+        cache.set(key, sources, settings.POST_IMAGE_CACHE_TIMEOUT)
+    return sources
+
+
+def stored_thumbnail(image_name, width, image_format):
+    """Готовая миниатюра из хранилища ключей sorl или None. Имя файла
+    sorl выводит из картинки и опций так же, как get_thumbnail, но
+    картинку не открывает и ничего не режет."""
+    backend = default.backend
+    options = {'format': image_format, **POST_THUMBNAIL_OPTIONS}
+    for option, value in backend.default_options.items():
+        options.setdefault(option, value)
+    for option, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(option, value)
+    name = backend._get_thumbnail_filename(
+        ImageFile(image_name), thumbnail_geometry(width), options)
+    return default.kvstore.get(ImageFile(name, default.storage))
+
+
+def stored_post_image_sources(image_name):
+    """То же, что post_image_sources, но только из готового: из кэша или
+    из хранилища ключей sorl. Если миниатюр ещё нет, ставит их нарезку
+    в очередь и возвращает None."""
+    sources = cache.get(POST_IMAGE_KEY.format(image_name))
+    if sources is not None:
+        return sources
+    schedule_post_thumbnails(image_name)
+    thumbnails = {}
+    for image_format in POST_THUMBNAIL_FORMATS:
+        variants = [(width, thumbnail) for width, thumbnail in (
+            (width, stored_thumbnail(image_name, width, image_format))
+            for width in POST_THUMBNAIL_WIDTHS) if thumbnail]
+        if variants:
+            thumbnails[image_format] = variants
+    if 'JPEG' not in thumbnails:
+        return None
+    return image_sources(thumbnails)
+
+
+@job(priority=THUMBNAILS_JOB_PRIORITY)
+def generate_post_thumbnails(image_name):
+    try:
+        post_image_sources(image_name)
+    except (OSError, SuspiciousFileOperation):
+        # Файла нет или это не картинка: повтор задачи не поможет.
+        logger.exception('Нет миниатюр для %s', image_name)
+
+
+def schedule_post_thumbnails(image_name):
+    """Ставит нарезку миниатюр в очередь задач. Пока её не выполнят,
+    шаблон показывает оригинал картинки."""
+    generate_post_thumbnails.enqueue(
+        image_name, dedup_key=f'post_thumbnails:{image_name}')
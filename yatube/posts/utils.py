@@ -1,8 +1,198 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+
+from django.core.paginator import Page, Paginator
 from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+CURSOR_SEPARATOR = '|'
+CURSOR_AFTER = 'a'
+CURSOR_BEFORE = 'b'
+PAGE_LAST = 'last'
+
+
+def encode_cursor(number, direction, key, pk):
+    """Упаковывает позицию в ленте в непрозрачный токен для ?cursor=.
+    key — значение ключа сортировки, уже приведённое к строке."""
+    raw = CURSOR_SEPARATOR.join((str(number), direction, key, str(pk)))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, load_key=parse_datetime):
+    """Распаковывает токен курсора, ключ сортировки разбирает load_key.
+    Для битого токена возвращает None."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(
+            token + '=' * (-len(token) % 4)).decode()
+        number, direction, key, pk = raw.split(CURSOR_SEPARATOR)
+        number, pk = int(number), int(pk)
+        key = load_key(key)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if (key is None or number < 1
+            or direction not in (CURSOR_AFTER, CURSOR_BEFORE)):
+        return None
+    return number, direction, key, pk
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (-pub_date, -id).
+
+    Страница выбирается условием на ключ сортировки, поэтому не нужны
+    ни COUNT(*), ни OFFSET: любая страница стоит столько же, сколько первая.
+    Другой ключ задаётся через ordering, например ('-pub_date', '-post_id')
+    для записей ленты подписок или ('pub_date', 'id') для комментариев
+    от старых к новым.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, object_list, per_page, ordering=None, count=None):
+        if ordering is not None:
+            self.ordering = ordering
+        if count is not None:
+            self.count = count
+        self.date_key, self.id_key = (
+            field.lstrip('-') for field in self.ordering)
+        self.descending = self.ordering[0].startswith('-')
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    def get_page(self, cursor=None, number=None):
+        position = decode_cursor(cursor, self.load_key)
+        if position is not None:
+            page = self.page_from_cursor(*position)
+        elif number == PAGE_LAST:
+            page = self.last_page()
+        else:
+            page = self.page_from_number(number)
+        page.cursor = cursor if position is not None else ''
+        page.page_links = self.page_links(page)
+        return page
+
+    def page_links(self, page, on_each_side=2):
+        """Окно ссылок на страницы: первая, последняя и соседние
+        с текущей, пропуски отмечены None. Номер даёт ссылку ?page=N
+        только в пределах PAGINATION_MAX_PAGE, соседние страницы
+        открываются курсорами."""
+        last = max(self.num_pages, page.number + bool(page.next_cursor))
+        links = {1: 'page=1', last: f'page={PAGE_LAST}', page.number: ''}
+        for number in range(page.number - on_each_side,
+                            page.number + on_each_side + 1):
+            if 1 < number < last and number <= settings.PAGINATION_MAX_PAGE:
+                links[number] = f'page={number}'
+        if page.previous_cursor:
+            links[page.number - 1] = f'cursor={page.previous_cursor}'
+        if page.next_cursor:
+            links[page.number + 1] = f'cursor={page.next_cursor}'
+        links[page.number] = ''
+        result = []
+        for number in sorted(links):
+            if result and number - result[-1][0] > 1:
+                result.append((None, None))
+            result.append((number, links[number]))
+        return result
+
+    def last_page(self):
+        """Последняя страница без OFFSET: хвост ленты в обратном
+        порядке, длина хвоста известна из count."""
+        number = self.num_pages
+        tail = self.count - (number - 1) * self.per_page
+        rows = list(self.object_list.reverse()[:max(tail, 1)])[::-1]
+        return self.build_page(rows, number,
+                               has_previous=number > 1, has_next=False)
+
+    def page_from_number(self, number):
+        """Старые ссылки ?page=N. Глубже PAGINATION_MAX_PAGE не уходим,
+        чтобы не выполнять OFFSET по всей таблице."""
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            number = 1
+        if not 1 <= number <= settings.PAGINATION_MAX_PAGE:
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self.object_list[offset:offset + self.per_page + 1])
+        return self.build_page(rows[:self.per_page], number,
+                               has_previous=number > 1,
+                               has_next=len(rows) > self.per_page)
+
+    def page_from_cursor(self, number, direction, key, pk):
+        after, before = ('lt', 'gt') if self.descending else ('gt', 'lt')
+        if direction == CURSOR_AFTER:
+            rows = list(self.object_list.filter(
+                self.key_filter(after, key, pk)
+            )[:self.per_page + 1])
+            return self.build_page(rows[:self.per_page], number,
+                                   has_previous=True,
+                                   has_next=len(rows) > self.per_page)
+        rows = list(self.object_list.filter(
+            self.key_filter(before, key, pk)
+        ).reverse()[:self.per_page + 1])
+        return self.build_page(rows[self.per_page - 1::-1], number,
+                               has_previous=len(rows) > self.per_page,
+                               has_next=True)
+
+    def key_filter(self, lookup, key, pk):
+        """(pub_date, id) < (X, Y) или > (X, Y). Лишнее условие на
+        pub_date с lte/gte даёт SQLite диапазон по индексу."""
+        return Q(**{f'{self.date_key}__{lookup}e': key}) & (
+            Q(**{f'{self.date_key}__{lookup}': key})
+            | Q(**{f'{self.id_key}__{lookup}': pk}))
+
+    def dump_key(self, value):
+        """Ключ сортировки для курсора; load_key разбирает его обратно."""
+        return value.isoformat()
+
+    def load_key(self, raw):
+        return parse_datetime(raw)
+
+    def key_values(self, obj):
+        return (self.dump_key(getattr(obj, self.date_key)),
+                getattr(obj, self.id_key))
+
+    def build_page(self, object_list, number, has_previous, has_next):
+        page = Page(object_list, number, self)
+        page.previous_cursor = None
+        page.next_cursor = None
+        if has_previous and object_list:
+            page.previous_cursor = encode_cursor(
+                max(number - 1, 1), CURSOR_BEFORE,
+                *self.key_values(object_list[0]))
+        if has_next and object_list:
+            page.next_cursor = encode_cursor(
+                number + 1, CURSOR_AFTER, *self.key_values(object_list[-1]))
+        return page
+
+
+class SearchPaginator(CursorPaginator):
+    """Пагинатор выдачи поиска по ключу (-score, -post_id),
+    где score — оценка релевантности из PostSearchQuerySet.search."""
+    ordering = ('-score', '-post_id')
+
+    def dump_key(self, value):
+        return repr(value)
+
+    def load_key(self, raw):
+        return float(raw)
+
+
+class IdPaginator(CursorPaginator):
+    """Пагинатор по одному id для таблиц без даты (группы, подписки):
+    ключ сортировки и уникальный ключ здесь совпадают."""
+    ordering = ('-id', '-id')
+
+    def dump_key(self, value):
+        return str(value)
+
+    def load_key(self, raw):
+        return int(raw)
 
 
-def pagination(request, post_list):
-    paginator = Paginator(post_list, settings.POSTS_AMOUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def pagination(request, post_list, ordering=None, count=None,
+               paginator_class=CursorPaginator):
+    paginator = paginator_class(post_list, settings.POSTS_AMOUNT,
+                                ordering, count)
+    return paginator.get_page(request.GET.get('cursor'),
+                              request.GET.get('page'))
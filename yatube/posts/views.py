@@ -1,48 +1,146 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-
-from .models import Post, Group, User, Follow
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import require_http_methods
+
+from .caching import (FEED_AUTHOR, FEED_GLOBAL, FEED_GROUP,
+                      cache_anonymous_feed, feed_cache_context, feed_name,
+                      followed_authors)
+from .feeds import (attach_latest_comments, author_feed, follower_feed,
+                    global_feed, group_feed)
+from .follows import follow, unfollow
+from .models import Post, PostSearchIndex, Group, User, UserStats
 from .forms import PostForm, CommentForm
-from .utils import pagination
+from .search import highlight, match_query
+from .utils import CursorPaginator, SearchPaginator, pagination
+
+COMMENTS_OLDEST = 'oldest'
+COMMENTS_NEWEST = 'newest'
+COMMENT_ORDERINGS = {
+    COMMENTS_OLDEST: ('pub_date', 'id'),
+    COMMENTS_NEWEST: ('-pub_date', '-id'),
+}
+
+
+def group_feed_name(slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return feed_name(FEED_GROUP, group.pk)
+
 
+def author_feed_name(username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return feed_name(FEED_AUTHOR, author.pk)
 
+
+def feed_page(request, feed):
+    """Страница ленты с последними комментариями к постам; у ленты
+    подписок записи заменены их постами."""
+    page_obj = pagination(request, feed.items, feed.ordering, feed.count)
+    if feed.ordering is not None:
+        page_obj.object_list = [entry.post for entry in page_obj]
+    attach_latest_comments(page_obj.object_list)
+    return page_obj
+
+
+@cache_anonymous_feed(lambda: FEED_GLOBAL)
 def index(request):
-    post_list = Post.objects.select_related('author')
-    page_obj = pagination(request, post_list)
-    return render(request, 'posts/index.html', {'page_obj': page_obj, })
+    feed = global_feed()
+    context = {
+        'page_obj': feed_page(request, feed),
+        **feed_cache_context(feed.name),
+    }
+    return render(request, 'posts/index.html', context)
 
 
+@cache_anonymous_feed(group_feed_name)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
-    page_obj = pagination(request, post_list)
+    feed = group_feed(group)
     context = {
         'group': group,
-        'page_obj': page_obj,
+        'page_obj': feed_page(request, feed),
+        **feed_cache_context(feed.name),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_anonymous_feed(author_feed_name)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.select_related('author', 'group')
-    page_obj = pagination(request, post_list)
-    following = Follow.objects.filter(
-        user__username=request.user, author=author)
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    feed = author_feed(author)
+    page_obj = feed_page(request, feed)
+    following = author.pk in followed_authors(request.user)
     context = {
         'page_obj': page_obj,
         'author': author,
         'following': following,
+        **feed_cache_context(feed.name),
     }
     return render(request, 'posts/profile.html', context)
 
 
+def comments_page(request, post):
+    """Страница комментариев поста по курсору, авторы в том же запросе.
+    ?order=newest — сначала новые, иначе сначала старые."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERINGS:
+        order = COMMENTS_OLDEST
+    paginator = CursorPaginator(
+        post.comments.select_related('author'), settings.COMMENTS_AMOUNT,
+        COMMENT_ORDERINGS[order], count=post.comments_count)
+    return {
+        'post_id': post.pk,
+        'comments': paginator.get_page(request.GET.get('cursor')),
+        'comments_order': order,
+    }
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
     return render(request, 'posts/post_detail.html',
-                  {'post': post, 'form': form, 'comments': comments})
+                  {'post': post, 'form': form,
+                   **comments_page(request, post)})
+
+
+def post_comments(request, post_id):
+    """Следующая страница комментариев HTML-фрагментом для кнопки
+    «Показать ещё» на странице поста."""
+    post = get_object_or_404(Post.objects.only('comments_count'),
+                             id=post_id)
+    return render(request, 'posts/includes/comments.html',
+                  comments_page(request, post))
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    match = match_query(query)
+    page_obj = None
+    if match:
+        results = (PostSearchIndex.objects.search(match)
+                   .select_related('post__author', 'post__group'))
+        # bm25() не работает во вложенном запросе, в который Django
+        # заворачивает COUNT по аннотированному queryset.
+        count = PostSearchIndex.objects.filter(stems__match=match).count()
+        page_obj = pagination(request, results, count=count,
+                              paginator_class=SearchPaginator)
+        page_obj.object_list = [entry.post for entry in page_obj]
+        followed = followed_authors(request.user)
+        for post in page_obj:
+            post.snippet = highlight(post.text, query)
+            post.author_followed = post.author_id in followed
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -81,30 +179,48 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        # Новый комментарий виден первым, сколько бы их ни было.
+        return redirect(reverse('posts:post_detail', args=(post_id,))
+                        + f'?order={COMMENTS_NEWEST}#comments')
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = (Post.objects.select_related('author', 'group')
-                 .filter(author__following__user=request.user))
-    page_obj = pagination(request, post_list)
-    return render(request, 'posts/follow.html', {'page_obj': page_obj, })
+    feed = follower_feed(request.user)
+    page_obj = feed_page(request, feed)
+    context = {
+        'page_obj': page_obj,
+        **feed_cache_context(feed.name),
+    }
+    return render(request, 'posts/follow.html', context)
+
+
+def follow_state(author, following):
+    """Ответ на POST: новое состояние подписки и число подписчиков,
+    без перерисовки профиля."""
+    followers_count = (UserStats.objects.filter(user=author)
+                       .values_list('followers_count', flat=True)
+                       .first())
+    return JsonResponse({'following': following,
+                         'followers_count': followers_count or 0})
 
 
 @login_required
+@require_http_methods(['GET', 'POST'])
 def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    if (Follow.objects.filter(user=request.user, author=author).exists()
-       or request.user == author):
-        return redirect('posts:profile', username=username)
-    Follow.objects.create(user=request.user, author=author)
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    follow(request.user, author)
+    if request.method == 'POST':
+        return follow_state(author, request.user != author)
     return redirect('posts:profile', username=username)
 
 
 @login_required
+@require_http_methods(['GET', 'POST'])
 def profile_unfollow(request, username):
-    author = get_object_or_404(User, username=username)
-    if Follow.objects.filter(user=request.user, author=author).exists():
-        Follow.objects.get(user=request.user, author=author).delete()
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    unfollow(request.user, author)
+    if request.method == 'POST':
+        return follow_state(author, False)
     return redirect('posts:index')
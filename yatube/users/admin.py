@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.admin import UserAdmin
+
+from core.admin import LargeTableAdmin
+
+User = get_user_model()
+
+
+class LargeUserAdmin(LargeTableAdmin, UserAdmin):
+    """Пользователи ищутся по началу тех же полей, что в UserAdmin, в том
+    числе в автодополнении полей автора и подписчика. Для username
+    индекс даёт уникальность, для остальных — миграция users 0001."""
+    prefix_fields = ('username', 'email', 'first_name', 'last_name')
+
+
+# Импорт django.contrib.auth.admin уже зарегистрировал стандартную
+# UserAdmin, её заменяем.
+admin.site.unregister(User)
+admin.site.register(User, LargeUserAdmin)
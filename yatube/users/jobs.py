@@ -0,0 +1,13 @@
+from django.core.mail import EmailMultiAlternatives
+
+from core.jobs import job
+
+EMAIL_JOB_PRIORITY = 20
+
+
+@job(priority=EMAIL_JOB_PRIORITY)
+def send_email(subject, body, from_email, to, html_body=None):
+    message = EmailMultiAlternatives(subject, body, from_email, to)
+    if html_body is not None:
+        message.attach_alternative(html_body, 'text/html')
+    message.send()
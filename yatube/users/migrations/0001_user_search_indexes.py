@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import migrations
+
+# Индексы для поиска пользователей в админке по началу полей
+# (users.admin.LargeUserAdmin). Таблица принадлежит django.contrib.auth
+# или приложению со своей моделью пользователя (AUTH_USER_MODEL),
+# поэтому индексы создаются SQL, а не через Meta модели. Таблица
+# и столбцы берутся из модели: у своей модели они называются иначе.
+SEARCH_FIELDS = ('email', 'first_name', 'last_name')
+
+User = get_user_model()
+
+
+def search_index(field):
+    """(sql, reverse_sql) индекса по полю модели пользователя."""
+    table = User._meta.db_table
+    column = User._meta.get_field(field).column
+    name = f'{table}_{column}_search_idx'
+    return (f'CREATE INDEX {name} ON {table} ({column})',
+            f'DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=sql, reverse_sql=reverse_sql)
+        for sql, reverse_sql in map(search_index, SEARCH_FIELDS)
+    ]
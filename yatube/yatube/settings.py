@@ -29,6 +29,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -40,11 +41,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.timing.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
@@ -55,11 +58,22 @@ ROOT_URLCONF = 'yatube.urls'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+FILE_UPLOAD_HANDLERS = [
+    'core.uploads.MaxSizeUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Загрузка картинок (core.uploads): наибольший файл, наибольшее число
+# пикселей по заголовку и наибольшая сторона сохраняемого оригинала.
+UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+UPLOAD_MAX_PIXELS = 40 * 10 ** 6
+UPLOAD_MAX_SIDE = 2048
+
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.timing.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -78,11 +92,44 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 с PRAGMA из OPTIONS['pragmas'] для каждого соединения.
+        'ENGINE': 'core.db',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос и не открывается заново.
+        'CONN_MAX_AGE': 10 * 60,
+        'OPTIONS': {
+            'pragmas': {
+                # Читатели не ждут писателя, а писатель — читателей.
+                'journal_mode': 'WAL',
+                # В WAL это не теряет целостность, только последние
+                # транзакции при отключении питания.
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 1024 * 1024,
+                # Отрицательное значение — в КиБ: 64 МиБ на соединение.
+                'cache_size': -64 * 1024,
+                # Сколько миллисекунд ждать блокировку записи.
+                'busy_timeout': 5000,
+            },
+        },
     }
 }
 
+# Реплики только для чтения (см. core.routers): пути к копиям базы
+# через запятую. Локальные копии обновляет manage.py sync_replicas.
+for number, path in enumerate(
+        filter(None, os.getenv('DATABASE_REPLICAS', '').split(',')), 1):
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'], 'NAME': path.strip(),
+        'TEST': {'MIRROR': 'default'}}
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Страницы, которые читают с реплик, и модели, которые читаются там.
+REPLICA_VIEWS = ('posts:index', 'posts:group_list', 'posts:profile',
+                 'posts:post_detail', 'posts:follow_index')
+REPLICA_APPS = ('posts', 'auth')
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_STICKY_SECONDS = 10
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
@@ -116,6 +163,27 @@ USE_TZ = True
 
 POST_TEXT_SHORT = 15
 POSTS_AMOUNT = 10
+COMMENTS_AMOUNT = 20
+COMMENTS_PREVIEW_AMOUNT = 2
+PAGINATION_MAX_PAGE = 50
+FEED_COUNT_TIMEOUT = 60 * 60
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+FEED_RESPONSE_CACHE_TIMEOUT = 60 * 60
+FOLLOWED_AUTHORS_TIMEOUT = 60 * 60 * 24
+POST_IMAGE_CACHE_TIMEOUT = 60 * 60 * 24
+SLOW_REQUEST_MS = 500
+# Очередь фоновых задач (core.jobs), её выполняет manage.py runworker:
+# без него не уходят письма и не наполняются ленты подписок. True —
+# выполнять задачи сразу при постановке, без обработчика (так в тестах,
+# см. core.testing).
+JOBS_EAGER = False
+JOB_LOCK_TIMEOUT = 10 * 60
+JOB_RETRY_DELAY = 10
+# Если готовая задача ждёт дольше, админка предупреждает, что
+# обработчик, похоже, не запущен.
+JOB_QUEUE_WARNING_DELAY = 5 * 60
+
+TEST_RUNNER = 'core.testing.TestRunner'
 
 STATIC_URL = '/static/'
 
@@ -123,6 +191,32 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        # Тесты пишут в свой файл рядом (core.testing).
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'default.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        'yatube.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}